@@ -2,26 +2,36 @@
 # app.py — NOOR AI (Final Clean Version)
 # ---------------------------------------------------
 
+import time
+_PROCESS_START = time.perf_counter()
+
 from flask import (
-    Flask, request, jsonify, render_template, send_from_directory,
+    Flask, Request, request, jsonify, render_template, send_from_directory,
     redirect, url_for, session, flash
 )
 import os
+import io
 import json
+import re
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from datetime import datetime
 from pathlib import Path
 
-# PDF generation
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-
-# project imports
-from KidneyClassification.utils.common import decodeImage
-from KidneyClassification.pipeline.prediction import PredictionPipeline
+# project imports (TensorFlow, OpenCV and ReportLab are imported lazily,
+# so the server answers /login and /healthz before the model is loaded)
+from KidneyClassification import logger
+from KidneyClassification.config.configuration import ConfigurationManager
+from KidneyClassification.utils.auth import AuthBusy, PasswordHasher, RateLimiter
+from KidneyClassification.utils.common import prune_directory
+from KidneyClassification.utils.metrics import REGISTRY, timed
+from KidneyClassification.utils.user_store import UserStore
 
 
 # ---------------------------------------------------
@@ -31,32 +41,30 @@ app = Flask(__name__)
 CORS(app)
 
 app.secret_key = os.environ.get("SECRET_KEY", "change-me")
-USERS_FILE = "users.json"
+USERS_FILE = "users.json"  # legacy store, imported into USERS_DB once
+USERS_DB = "users.sqlite"
 
 
 # ---------------------------------------------------
 # User storage
 # ---------------------------------------------------
-def ensure_default_users():
-    if not os.path.exists(USERS_FILE):
-        users = {
-            "admin": {
-                "password": generate_password_hash("admin123"),
-                "display_name": "Administrator"
-            }
-        }
-        with open(USERS_FILE, "w") as f:
-            json.dump(users, f, indent=2)
+users = UserStore(USERS_DB, legacy_json=USERS_FILE)
 
-
-def load_users():
-    if not os.path.exists(USERS_FILE):
-        ensure_default_users()
-    return json.load(open(USERS_FILE))
+auth_config = ConfigurationManager().get_auth_config()
+hasher = PasswordHasher(
+    auth_config.hash_method,
+    workers=auth_config.hash_workers,
+    max_pending=auth_config.hash_max_pending
+)
+ip_limiter = RateLimiter(auth_config.ip_attempts, auth_config.ip_window_s)
+user_limiter = RateLimiter(auth_config.user_failures, auth_config.user_window_s)
 
 
-def save_users(users: dict):
-    json.dump(users, open(USERS_FILE, "w"), indent=2)
+def ensure_default_users():
+    # fresh install only: never re-create admin/admin123 after an operator
+    # removed or renamed it, and never alongside a users.json to migrate
+    if len(users) == 0 and not os.path.exists(USERS_FILE):
+        users.seed("admin", hasher.hash("admin123"), "Administrator")
 
 
 ensure_default_users()
@@ -78,22 +86,124 @@ def login_required(f):
 # ---------------------------------------------------
 # Prediction Pipeline Wrapper
 # ---------------------------------------------------
-latest_result = {}
+# uploads, Grad-CAM overlays and reports are pruned past this age / size
+ARTIFACT_MAX_AGE_S = 24 * 3600
+ARTIFACT_MAX_BYTES = 1024 * 2**20
+ARTIFACT_SWEEP_S = 600
+JOB_MAX_AGE_S = 7 * 24 * 3600
 
 
 class ClientApp:
+    """
+    Loads the PredictionPipeline on a background thread so the server can
+    start (and answer health checks) right away. `state` moves from
+    "loading" to "ready" or "failed"; predictions are refused until ready.
+    """
+
     def __init__(self):
+        # only used by PredictionPipeline.predict() when called without image data
         self.filename = "inputImage.jpg"
-        self.classifier = PredictionPipeline(self.filename)
+        self.classifier = None
+        # prediction id -> public result, looked up by /heatmap and /download_report
+        self.results = None
+        self.jobs = None
+        self.state = "loading"
+        self.error = None
+        self.load_seconds = None
+        self.cold_start_seconds = None
+
+    def start(self):
+        threading.Thread(target=self._load, name="ModelLoader", daemon=True).start()
+        threading.Thread(target=self._sweep_artifacts, name="ArtifactJanitor", daemon=True).start()
+
+    def _sweep_artifacts(self):
+        while True:
+            time.sleep(ARTIFACT_SWEEP_S)
+            try:
+                from KidneyClassification.pipeline.prediction import GRADCAM_DIR, UPLOADS_DIR
+
+                for directory in (UPLOADS_DIR, GRADCAM_DIR):
+                    removed = prune_directory(
+                        Path(directory), "*.jpg", ARTIFACT_MAX_AGE_S, ARTIFACT_MAX_BYTES
+                    )
+                    if removed:
+                        logger.info(f"pruned {len(removed)} files from {directory}")
+                if self.jobs is not None:
+                    self.jobs.prune(JOB_MAX_AGE_S)
+            except Exception as e:
+                logger.exception(e)
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            from KidneyClassification.pipeline.job_queue import JobQueue
+            from KidneyClassification.pipeline.prediction import PredictionPipeline
+            from KidneyClassification.pipeline.result_cache import JSONStore
+
+            # model path, backend, warm-up, micro-batcher and store settings live in config.yaml
+            prediction_config = ConfigurationManager().get_prediction_config()
+            self.results = JSONStore(prediction_config.results_size, prediction_config.results_dir)
+            classifier = PredictionPipeline(self.filename, config=prediction_config)
+            if prediction_config.warmup:
+                # trace the Grad-CAM step too, it is the slowest first call
+                classifier.warmup_gradcam()
+
+            self.classifier = classifier
+            self.jobs = JobQueue(
+                prediction_config.jobs_db, prediction_config.jobs_dir, classifier.predict_many,
+                batch_size=prediction_config.jobs_batch_size,
+                workers=prediction_config.jobs_workers
+            )
+            self.jobs.start()
+            state = "ready"
+        except Exception as e:
+            logger.exception(e)
+            self.error = str(e)
+            state = "failed"
+
+        self.load_seconds = time.perf_counter() - start
+        self.cold_start_seconds = time.perf_counter() - _PROCESS_START
+        # last, so /readyz never reports ready without the timings
+        self.state = state
+
+        logger.info(
+            f"model {self.state} after {self.load_seconds:.2f}s "
+            f"(cold start {self.cold_start_seconds:.2f}s since process start)"
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> dict:
+        status = {
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "cold_start_seconds": self.cold_start_seconds,
+        }
+        if self.ready:
+            status["latency"] = self.classifier.latency_summary()
+        return status
 
 
 clApp = ClientApp()
+clApp.start()
+logger.info(f"app imported in {time.perf_counter() - _PROCESS_START:.2f}s, model loading in background")
 
 
 # ---------------------------------------------------
 # Routes
 # ---------------------------------------------------
 
+def _auth_refused(template, retry_after, status=429):
+    if status == 429:
+        flash("Too many attempts, please wait a moment and try again.", "danger")
+    else:
+        flash("The server is busy, please try again in a few seconds.", "warning")
+    return render_template(template), status, {"Retry-After": str(retry_after)}
+
+
 @app.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
@@ -101,16 +211,21 @@ def register():
         password = request.form["password"]
         display = request.form.get("display_name", username)
 
-        users = load_users()
-        if username in users:
+        if not ip_limiter.allow(request.remote_addr):
+            return _auth_refused("register.html", ip_limiter.retry_after(request.remote_addr))
+        ip_limiter.hit(request.remote_addr)
+
+        if users.get(username) is not None:
+            flash("Username already exists.", "danger")
+            return redirect("/register")
+        try:
+            password_hash = hasher.hash(password)
+        except AuthBusy:
+            return _auth_refused("register.html", 5, status=503)
+        if not users.add(username, password_hash, display):
             flash("Username already exists.", "danger")
             return redirect("/register")
 
-        users[username] = {
-            "password": generate_password_hash(password),
-            "display_name": display
-        }
-        save_users(users)
         flash("Registration successful!", "success")
         return redirect("/login")
 
@@ -123,17 +238,38 @@ def login():
         username = request.form["username"].strip()
         password = request.form["password"]
 
-        users = load_users()
-        user = users.get(username)
+        # already signed in as this user: the session cookie is proof enough
+        if session.get("username") == username:
+            return redirect("/")
 
-        if not user or not check_password_hash(user["password"], password):
+        ip, user_key = request.remote_addr, username.lower()
+        for limiter, key in ((ip_limiter, ip), (user_limiter, user_key)):
+            if not limiter.allow(key):
+                return _auth_refused("login.html", limiter.retry_after(key))
+
+        user = users.get(username)
+        try:
+            valid = user is not None and hasher.verify(user["password"], password)
+        except AuthBusy:
+            return _auth_refused("login.html", 5, status=503)
+
+        # only failures count, so users behind a shared NAT can keep signing in
+        if not valid:
+            ip_limiter.hit(ip)
+            user_limiter.hit(user_key)
             flash("Invalid credentials", "danger")
             return redirect("/login")
 
+        user_limiter.reset(user_key)
+        if hasher.needs_rehash(user["password"]):
+            hasher.rehash_later(password, lambda h: users.set_password(username, h))
+
         session["username"] = username
         session["display_name"] = user["display_name"]
         return redirect("/")
 
+    if "username" in session:
+        return redirect("/")
     return render_template("login.html")
 
 
@@ -149,43 +285,403 @@ def home():
     return render_template("index.html")
 
 
+# ---------------------------------------------------
+# Health checks
+# ---------------------------------------------------
+@app.route("/healthz")
+def liveness():
+    return jsonify({
+        "status": "alive",
+        "uptime_seconds": time.perf_counter() - _PROCESS_START,
+    })
+
+
+@app.route("/readyz")
+def readiness():
+    return jsonify(clApp.status()), 200 if clApp.ready else 503
+
+
+@app.route("/cache/stats")
+def cache_stats():
+    cache = clApp.classifier.cache if clApp.ready else None
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+
+# ---------------------------------------------------
+# Metrics (Prometheus text format)
+# ---------------------------------------------------
+def _classifier():
+    return clApp.classifier if clApp.ready else None
+
+
+def _cache_stat(name):
+    def read():
+        stores = [("results", clApp.results)]
+        if _classifier() is not None:
+            stores.append(("prediction", clApp.classifier.cache))
+        return [((store,), s.stats()[name]) for store, s in stores if s is not None]
+    return read
+
+
+def _queue_depths():
+    depths = [(("report_render",), reports.pending())]
+    if _classifier() is not None and clApp.classifier.batcher is not None:
+        depths.append((("micro_batch",), clApp.classifier.batcher.pending()))
+    if clApp.jobs is not None:
+        depths.append((("jobs",), clApp.jobs.pending().get("queued", 0)))
+    return depths
+
+
+REGISTRY.callback("kidney_model_ready", "1 once the model is loaded and warmed up",
+                  lambda: int(clApp.ready))
+REGISTRY.callback("kidney_model_load_seconds", "Time to load and warm up the model",
+                  lambda: clApp.load_seconds)
+REGISTRY.callback("kidney_cold_start_seconds", "Process start until the model was ready",
+                  lambda: clApp.cold_start_seconds)
+REGISTRY.callback("kidney_queue_depth", "Work waiting in an in-process queue",
+                  _queue_depths, ["queue"])
+REGISTRY.callback("kidney_cache_entries", "Entries held in memory by a result store",
+                  _cache_stat("entries"), ["store"])
+for _stat in ("hits", "misses", "evictions"):
+    REGISTRY.callback(f"kidney_cache_{_stat}_total", f"Result store {_stat}",
+                      _cache_stat(_stat), ["store"], kind="counter")
+
+
+@app.route("/metrics")
+def metrics():
+    return app.response_class(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
 # ---------------------------------------------------
 # Predict Route
 # ---------------------------------------------------
+# prediction and job IDs are uuid4().hex; anything else never reaches a store
+_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def _valid_id(value) -> bool:
+    return isinstance(value, str) and _ID_RE.fullmatch(value) is not None
+
+
+def _lookup_result():
+    """
+    The caller's prediction named by ?id=, else their most recent one.
+    Results belonging to another user, and malformed IDs, are treated as
+    missing.
+    """
+    prediction_id = request.args.get("id") or session.get("last_prediction_id")
+    if not _valid_id(prediction_id) or clApp.results is None:
+        return None
+    record = clApp.results.get(prediction_id)
+    if record is None or record.get("username") != session["username"]:
+        return None
+    return record
+
+
+def _not_ready():
+    return jsonify({
+        "status": "error",
+        "message": f"model is {clApp.state}, try again shortly"
+    }), 503
+
+
+def _publish(result):
+    """store a pipeline result under a new prediction ID and queue its report"""
+    public_result = {
+        "prediction": result["prediction"],
+        "confidence": result["confidence"],
+        "gradcam_path": result["gradcam_path"],
+        "original_image_path": result["original_image_path"],
+        "cached": result["cached"],
+        "id": uuid.uuid4().hex,
+    }
+    clApp.results.put(
+        public_result["id"], dict(public_result, username=session["username"])
+    )
+    session["last_prediction_id"] = public_result["id"]
+
+    # start rendering the PDF now so /download_report is served from disk;
+    # the task only holds the artifact paths, never the decoded images
+    reports.submit(public_result["id"], session["display_name"], public_result)
+    return public_result
+
+
 @app.route("/predict", methods=["POST"])
 @login_required
 def predictRoute():
-    global latest_result
+    if not clApp.ready:
+        return _not_ready()
 
     try:
-        image = request.json.get("image")
-        decodeImage(image, clApp.filename)
+        from KidneyClassification.utils.image_utils import decode_base64
 
-        result = clApp.classifier.predict()[0]
+        image = request.json.get("image")
+        with timed("base64_decode"):
+            image_bytes = decode_base64(image)
 
-        latest_result = {
-            "prediction": result["prediction"],
-            "confidence": result["confidence"],
-            "gradcam_path": result["gradcam_path"],
-            "original_image_path": result["original_image_path"],
-        }
+        result = clApp.classifier.predict(image_bytes)[0]
+        public_result = _publish(result)
 
-        return jsonify({"status": "success", "result": latest_result})
+        return jsonify({"status": "success", "result": public_result})
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
 
+# ---------------------------------------------------
+# Raw upload route (multipart or octet-stream, no base64)
+# ---------------------------------------------------
+MAX_UPLOAD_BYTES = 20 * 2**20          # per image
+MAX_UPLOAD_IMAGES = 32                 # per request
+MAX_UPLOAD_REQUEST_BYTES = 64 * 2**20  # whole request (also /predict's base64 JSON)
+UPLOAD_CHUNK = 64 * 1024
+
+# refused by werkzeug before the form parser spools anything; /jobs raises
+# these for its own requests (see _stream_job_images)
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_REQUEST_BYTES
+app.config["MAX_FORM_MEMORY_SIZE"] = 2**20  # non-file form fields
+app.config["MAX_FORM_PARTS"] = MAX_UPLOAD_IMAGES + 16
+
+
+class _PartLimitedFile(tempfile.SpooledTemporaryFile):
+    """spooled multipart part that refuses to grow past MAX_UPLOAD_BYTES"""
+
+    def write(self, data):
+        if self.tell() + len(data) > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"image larger than {MAX_UPLOAD_BYTES} bytes")
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """applies the per-image limit while the form parser writes each part"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return _PartLimitedFile(max_size=500 * 1024, mode="rb+")
+
+
+app.request_class = UploadRequest
+
+
+def _copy_limited(stream, out, limit=MAX_UPLOAD_BYTES) -> int:
+    """copy a stream to `out` in chunks, refusing more than `limit` bytes"""
+    size = 0
+    while True:
+        chunk = stream.read(min(UPLOAD_CHUNK, limit + 1 - size))
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise RequestEntityTooLarge(f"image larger than {limit} bytes")
+        out.write(chunk)
+    return size
+
+
+def _read_limited(stream, limit=MAX_UPLOAD_BYTES):
+    """read a stream to the end, refusing more than `limit` bytes (or none)"""
+    buf = io.BytesIO()
+    if not _copy_limited(stream, buf, limit):
+        raise ValueError("empty image uploaded")
+    return buf.getvalue()
+
+
+def _uploaded_streams():
+    """
+    One stream per image of the request. Multipart parts have already been
+    spooled by the form parser, each within MAX_UPLOAD_BYTES and all of
+    them within MAX_UPLOAD_REQUEST_BYTES.
+    """
+    if request.mimetype == "multipart/form-data":
+        if request.content_length is None:
+            raise RequestEntityTooLarge("multipart uploads need a Content-Length")
+        files = [f for name in request.files for f in request.files.getlist(name)]
+        if len(files) > MAX_UPLOAD_IMAGES:
+            raise RequestEntityTooLarge(f"at most {MAX_UPLOAD_IMAGES} images per request")
+        return [f.stream for f in files]
+
+    if request.mimetype == "application/octet-stream" or request.mimetype.startswith("image/"):
+        return [] if request.content_length == 0 else [request.stream]
+
+    raise ValueError("send multipart/form-data or application/octet-stream")
+
+
+@app.route("/predict/upload", methods=["POST"])
+@login_required
+def predictUploadRoute():
+    """
+    Raw image uploads: one image as the request body
+    (application/octet-stream or image/*), or any number of files up to
+    MAX_UPLOAD_IMAGES as multipart/form-data. Several images are predicted
+    as one batch.
+    """
+    if not clApp.ready:
+        return _not_ready()
+
+    try:
+        streams = _uploaded_streams()
+        if not streams:
+            return jsonify({"status": "error", "message": "no image uploaded"}), 400
+
+        # lazy: predict_many decodes each image as soon as it is read
+        images = (_read_limited(stream) for stream in streams)
+        results = clApp.classifier.predict_many(images)
+        return jsonify({"status": "success", "results": [_publish(r) for r in results]})
+
+    except RequestEntityTooLarge as e:
+        return jsonify({"status": "error", "message": e.description}), 413
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.exception(e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# ---------------------------------------------------
+# Job API (queued batch prediction)
+# ---------------------------------------------------
+MAX_JOB_IMAGES = 1000
+MAX_JOB_BYTES = 2 * 2**30  # whole request
+
+
+def _stream_job_images(job_dir) -> int:
+    """
+    Write the request's images straight into job_dir (one file per image,
+    named by JobQueue.image_name) instead of holding them in memory, and
+    return how many there were. Multipart parts are already spooled to
+    temporary files by the form parser rather than kept in memory.
+    """
+    if request.content_length is None:
+        raise RequestEntityTooLarge("job uploads need a Content-Length")
+    # jobs are the one route allowed past the app-wide upload limits
+    request.max_content_length = MAX_JOB_BYTES
+    request.max_form_parts = MAX_JOB_IMAGES + 16
+    if request.content_length > MAX_JOB_BYTES:
+        raise RequestEntityTooLarge(f"request larger than {MAX_JOB_BYTES} bytes")
+
+    if request.mimetype == "multipart/form-data":
+        streams = (f.stream for name in request.files for f in request.files.getlist(name))
+    elif request.mimetype == "application/octet-stream" or request.mimetype.startswith("image/"):
+        streams = [request.stream]
+    else:
+        raise ValueError("send multipart/form-data or application/octet-stream")
+
+    count = 0
+    for stream in streams:
+        if count == MAX_JOB_IMAGES:
+            raise RequestEntityTooLarge(f"at most {MAX_JOB_IMAGES} images per job")
+        path = job_dir / clApp.jobs.image_name(count)
+        with open(path, "wb") as out:
+            size = _copy_limited(stream, out)
+        if size:
+            count += 1
+        else:
+            path.unlink()
+    return count
+
+
+def _own_job(job_id):
+    """the caller's job status, or None (unknown job or someone else's)"""
+    if not _valid_id(job_id) or clApp.jobs is None:
+        return None
+    job = clApp.jobs.status(job_id)
+    if job is None or job["username"] != session["username"]:
+        return None
+    return job
+
+
+@app.route("/jobs", methods=["POST"])
+@login_required
+def submit_job():
+    """
+    Queue images (same formats as /predict/upload, up to MAX_JOB_IMAGES
+    and MAX_JOB_BYTES in total) and return a job ID straight away; the
+    images are streamed to the job directory and the job workers do the
+    inference.
+    """
+    if not clApp.ready:
+        return _not_ready()
+
+    job_id, job_dir = clApp.jobs.reserve()
+    try:
+        count = _stream_job_images(job_dir)
+        if not count:
+            raise ValueError("no image uploaded")
+    except RequestEntityTooLarge as e:
+        clApp.jobs.discard(job_id)
+        return jsonify({"status": "error", "message": e.description}), 413
+    except ValueError as e:
+        clApp.jobs.discard(job_id)
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except BaseException:
+        clApp.jobs.discard(job_id)
+        raise
+
+    clApp.jobs.commit(session["username"], job_id, count)
+    return jsonify({
+        "status": "success",
+        "job_id": job_id,
+        "status_url": url_for("job_status", job_id=job_id),
+        "events_url": url_for("job_events", job_id=job_id),
+        "results_url": url_for("job_results", job_id=job_id),
+    }), 202
+
+
+@app.route("/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "unknown job"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/events")
+@login_required
+def job_events(job_id):
+    """Server-sent events: one progress message per change until the job finishes."""
+    if _own_job(job_id) is None:
+        return jsonify({"status": "error", "message": "unknown job"}), 404
+
+    def stream():
+        last = None
+        while True:
+            job = clApp.jobs.status(job_id)
+            if job is None:
+                return
+            progress = (job["done"], job["failed"])
+            if progress != last:
+                last = progress
+                yield f"data: {json.dumps(job)}\n\n"
+            if job["status"] == "finished":
+                return
+            time.sleep(1.0)
+
+    return app.response_class(stream(), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache"})
+
+
+@app.route("/jobs/<job_id>/results")
+@login_required
+def job_results(job_id):
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "unknown job"}), 404
+    return jsonify(dict(job, results=clApp.jobs.results(job_id)))
+
+
 # ---------------------------------------------------
 # Heatmap Page
 # ---------------------------------------------------
 @app.route("/heatmap")
 @login_required
 def heatmap_page():
-    if not latest_result:
+    record = _lookup_result()
+    if record is None:
         return render_template("heatmap.html", data={"prediction": None})
 
-    return render_template("heatmap.html", data=latest_result)
+    return render_template("heatmap.html", data=record)
 
 
 @app.route("/static/<path:filename>")
@@ -201,15 +697,22 @@ def _ensure_reports():
     return Path("static/reports")
 
 
-def generate_report_pdf(display_name, result):
+def generate_report_pdf(display_name, result, prediction_id=None):
     """
     Always save as:
         Kidney_Report_<timestamp>.pdf
+    or Kidney_Report_<timestamp>_<prediction id>.pdf when rendered for a
+    prediction, so concurrent reports never share a file.
     """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
+
     reports_dir = _ensure_reports()
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    filename = f"Kidney_Report_{timestamp}.pdf"
+    suffix = f"_{prediction_id}" if prediction_id else ""
+    filename = f"Kidney_Report_{timestamp}{suffix}.pdf"
     path = reports_dir / filename
 
     c = canvas.Canvas(str(path), pagesize=letter)
@@ -232,13 +735,13 @@ def generate_report_pdf(display_name, result):
     c.line(margin, y, width - margin, y)
     y -= 20
 
-    # Images
-    def draw_img(img_path, caption):
+    # Images (the artifacts saved by the prediction)
+    def draw_img(img_src, caption):
         nonlocal y
-        if not img_path:
+        if not img_src:
             return
         try:
-            img = ImageReader(img_path)
+            img = ImageReader(img_src)
             iw, ih = img.getSize()
             scale = min(450 / iw, 250 / ih)
             w = iw * scale
@@ -266,14 +769,118 @@ def generate_report_pdf(display_name, result):
     return str(path)
 
 
+class ReportStore:
+    """
+    Renders report PDFs on a small worker pool as soon as a prediction
+    completes and keeps one PDF per prediction ID, so downloads are served
+    from disk instead of re-rendering on the request thread.
+
+    At most `max_pending` renders are queued ahead of time; predictions
+    beyond that are not pre-rendered, their PDF is rendered when it is
+    first downloaded. Queued renders only hold the artifact paths.
+
+    static/reports is kept bounded: after each render, PDFs older than
+    `max_age_s` are deleted, then the oldest ones until the directory is
+    under `max_total_bytes`.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, max_age_s=ARTIFACT_MAX_AGE_S,
+                 max_total_bytes=200 * 2**20):
+        self.max_pending = max_pending
+        self.max_age_s = max_age_s
+        self.max_total_bytes = max_total_bytes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._reports = {}  # prediction id -> Future[pdf path]
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, prediction_id, display_name, result, force=False):
+        """
+        Queue the render unless one exists; returns its Future, or None
+        when the queue is full (only for force=False).
+        """
+        with self._lock:
+            future = self._reports.get(prediction_id)
+            if future is None:
+                if not force and self._pending >= self.max_pending:
+                    return None
+                self._pending += 1
+                future = self._pool.submit(self._render, prediction_id, display_name, result)
+                self._reports[prediction_id] = future
+            return future
+
+    def get(self, prediction_id, display_name, result, timeout=10):
+        """
+        PDF path for the prediction, rendering it now if it was deferred or
+        evicted. Raises concurrent.futures.TimeoutError when the render is
+        not done within `timeout` seconds; it keeps running, so a later
+        call picks it up.
+        """
+        future = self.submit(prediction_id, display_name, result, force=True)
+        path = future.result(timeout=timeout)
+        if not os.path.exists(path):
+            self._forget(prediction_id, future)
+            path = self.submit(prediction_id, display_name, result, force=True).result(timeout=timeout)
+        return path
+
+    def _forget(self, prediction_id, future):
+        with self._lock:
+            if self._reports.get(prediction_id) is future:
+                del self._reports[prediction_id]
+
+    def pending(self) -> int:
+        """renders queued or in progress"""
+        with self._lock:
+            return self._pending
+
+    def _render(self, prediction_id, display_name, result):
+        try:
+            with timed("pdf_render"):
+                path = generate_report_pdf(display_name, result, prediction_id)
+        except Exception:
+            # drop the failed future so the next download retries the render
+            with self._lock:
+                future = self._reports.get(prediction_id)
+                if future is not None and not future.done():
+                    del self._reports[prediction_id]
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+        try:
+            self._evict(keep=path)
+        except OSError as e:
+            logger.warning(f"report eviction failed: {e}")
+        return path
+
+    def _evict(self, keep):
+        removed = set(prune_directory(
+            _ensure_reports(), "*.pdf", self.max_age_s, self.max_total_bytes, keep=[keep]
+        ))
+        if removed:
+            with self._lock:
+                for pid, future in list(self._reports.items()):
+                    if future.done() and not future.exception() and future.result() in removed:
+                        del self._reports[pid]
+            logger.info(f"evicted {len(removed)} old reports")
+
+
+reports = ReportStore()
+
+
 @app.route("/download_report")
 @login_required
 def download_report():
-    if not latest_result:
+    record = _lookup_result()
+    if record is None:
         flash("No prediction yet!", "warning")
         return redirect("/")
 
-    pdf_path = generate_report_pdf(session["display_name"], latest_result)
+    try:
+        pdf_path = reports.get(record["id"], session["display_name"], record)
+    except FutureTimeout:
+        return "The report is still being generated, try again in a few seconds.", \
+            503, {"Retry-After": "5"}
 
     return send_from_directory(
         "static/reports",
@@ -0,0 +1,144 @@
+"""
+JSON results for the benchmarks, and a regression check between two runs.
+
+inference_bench.py and load_generator.py write one file per run:
+
+    {"benchmark": ..., "environment": {commit, python, cpus, ...},
+     "args": {...}, "results": [{"name": ..., <metric>: <value>, ...}, ...]}
+
+Compare a run against a baseline (exit status 1 on a regression):
+
+    python benchmarks/bench_results.py baseline.json current.json --tolerance 0.10
+
+Metrics ending in _ms / _s / _mb are lower-is-better, those ending in
+_per_s higher-is-better; everything else is reported but not judged.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def environment() -> dict:
+    """what the numbers depend on besides the code"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    versions = {}
+    for module in ("numpy", "tensorflow", "tflite_runtime", "onnxruntime", "cv2"):
+        try:
+            versions[module] = __import__(module).__version__
+        except Exception:
+            continue
+
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def read_result(lines) -> dict:
+    """
+    The JSON result line of a benchmark child process. `lines` is its
+    stdout (a stream or a list of lines); the project logger writes there
+    too, so everything before the JSON line is skipped.
+    """
+    for line in lines:
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError("benchmark process exited without a result")
+
+
+def write_results(path, benchmark, args, results):
+    doc = {
+        "benchmark": benchmark,
+        "environment": environment(),
+        "args": vars(args),
+        "results": results,
+    }
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(doc, f, indent=2)
+        print(f"results written to {path}")
+    return doc
+
+
+def _direction(metric):
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith(("_ms", "_s", "_mb")):
+        return -1
+    return 0
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(baseline, current, tolerance):
+    """(metric, old, new, change, regressed) for every metric in both runs"""
+    old = {r["name"]: _flatten("", r, {}) for r in baseline["results"]}
+    new = {r["name"]: _flatten("", r, {}) for r in current["results"]}
+    rows = []
+    for name in old.keys() & new.keys():
+        for metric in sorted(old[name].keys() & new[name].keys()):
+            a, b = old[name][metric], new[name][metric]
+            direction = _direction(metric.rsplit(".", 1)[-1])
+            if not a or not direction:
+                continue
+            change = (b - a) / abs(a)
+            rows.append((f"{name}.{metric}", a, b, change, change * direction < -tolerance))
+    return sorted(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative slowdown allowed before a metric counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline["benchmark"] != current["benchmark"]:
+        sys.exit(f"cannot compare {baseline['benchmark']} with {current['benchmark']} results")
+
+    print(f"baseline {baseline['environment']['commit']}  current {current['environment']['commit']}")
+    regressions = 0
+    for metric, a, b, change, regressed in compare(baseline, current, args.tolerance):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{metric:<50} {a:12.3f} -> {b:12.3f}  {change:+7.1%}{flag}")
+
+    if regressions:
+        sys.exit(f"{regressions} metric(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
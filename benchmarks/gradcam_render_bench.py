@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: Grad-CAM weighting + heatmap rendering, old vs new.
+
+Feeds the same synthetic block5_conv3 activations/gradients (14x14x512) and a
+synthetic scan through
+  * legacy  - the per-channel Python loop over EagerTensor slices plus the
+              allocate-per-stage OpenCV rendering PredictionPipeline used to do
+  * current - compute_cam (one einsum) + HeatmapRenderer (reused buffers)
+and prints the mean per-request cost of each.
+
+    python benchmarks/gradcam_render_bench.py --height 512 --width 512 --repeat 50
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from KidneyClassification.utils.gradcam import HeatmapRenderer, compute_cam
+
+try:
+    import tensorflow as tf
+except ImportError:  # the legacy path still runs, just on NumPy instead of EagerTensors
+    tf = None
+
+
+def legacy(orig, conv_outputs, grads, alpha=0.45):
+    oh, ow = orig.shape[:2]
+    weights = tf.reduce_mean(grads[0], axis=(0, 1)) if tf else grads[0].mean(axis=(0, 1))
+
+    cam = np.zeros(conv_outputs[0].shape[0:2], dtype=np.float32)
+    for i, w in enumerate(weights):
+        cam += w * conv_outputs[0][:, :, i]
+
+    cam = np.maximum(cam, 0)
+    cam /= (cam.max() + 1e-8)
+    heatmap = cv2.resize(cam, (ow, oh))
+
+    gray = cv2.cvtColor(orig, cv2.COLOR_RGB2GRAY)
+    _, mask = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY)
+    heatmap *= (mask.astype("float32") / 255.0)
+    heatmap /= (heatmap.max() + 1e-8)
+
+    heatmap_color = cv2.applyColorMap(np.uint8(255 * heatmap), cv2.COLORMAP_JET)
+    heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
+    return cv2.addWeighted(orig, 1 - alpha, heatmap_color, alpha, 0)
+
+
+def current(renderer, orig, conv_outputs, grads, alpha=0.45):
+    if tf is not None:
+        conv_outputs, grads = conv_outputs.numpy(), grads.numpy()
+    cam = compute_cam(conv_outputs, grads)[0]
+    return renderer.render(orig, cam, alpha)
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    orig = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    conv = rng.random((1, 14, 14, 512), dtype=np.float32)
+    grads = rng.standard_normal((1, 14, 14, 512)).astype(np.float32)
+    if tf is not None:
+        conv, grads = tf.constant(conv), tf.constant(grads)
+
+    renderer = HeatmapRenderer()
+    old_ms = timeit(lambda: legacy(orig, conv, grads), args.repeat)
+    new_ms = timeit(lambda: current(renderer, orig, conv, grads), args.repeat)
+
+    backend = "EagerTensor" if tf is not None else "NumPy"
+    print(f"image {args.width}x{args.height}, activations on {backend}")
+    print(f"legacy : {old_ms:8.3f} ms/request")
+    print(f"current: {new_ms:8.3f} ms/request  ({old_ms / new_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmark: PredictionPipeline inference, per backend.
+
+Each backend runs in its own process, so load time, cold start and peak
+memory are measured from a clean interpreter. For every backend:
+
+  * cold_start_s   - process spawn until the first prediction returned
+  * load_s         - PredictionPipeline construction (model load, no warm-up)
+  * first_call_ms  - the first forward pass on the cold model (tracing,
+                     kernel selection, allocation)
+  * warmup_s       - the backend's warm-up over --batch-sizes afterwards
+  * single         - p50/p95/p99 of one-image forward passes
+  * batch_<n>      - images/s and ms/batch for each --batch-sizes entry
+  * end_to_end     - predict() on an encoded JPEG (decode, forward,
+                     Grad-CAM for tumours, artifact writes), cache off
+  * gradcam        - first call and p50/p95 of the Grad-CAM pass, when a
+                     Keras model is available for it
+  * peak_rss_mb    - maximum resident memory of the process
+
+Inputs are synthetic and seeded (--seed), so runs on the same machine
+are comparable. Results go to --output as JSON; compare two runs with
+bench_results.py.
+
+    python benchmarks/inference_bench.py --backends keras tflite --output bench/inference.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+from bench_results import read_result, write_results
+
+BACKENDS = ["keras", "saved_model", "tflite", "onnx"]
+
+
+def percentiles(seconds) -> dict:
+    import numpy as np
+
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def timed_calls(fn, repeat):
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(args):
+    import cv2
+    import numpy as np
+    from KidneyClassification.config.configuration import ConfigurationManager
+    from KidneyClassification.pipeline.prediction import PredictionPipeline
+
+    start = time.perf_counter()
+    config = replace(
+        ConfigurationManager().get_prediction_config(),
+        model_path=Path(args.model),
+        backend=args.backend,
+        gradcam_model_path=Path(args.gradcam_model),
+        warmup=False,  # warmed up below, after the cold first call is timed
+        cache_size=0,
+        max_batch_size=1,  # no MicroBatcher: time the backend itself
+    )
+    pipeline = PredictionPipeline(None, config=config)
+    load_s = time.perf_counter() - start
+
+    h, w = pipeline.backend.input_shape[1:3]
+    rng = np.random.default_rng(args.seed)
+    images = rng.integers(0, 256, (max(args.batch_sizes), h, w, 3), dtype=np.uint8)
+    jpegs = [
+        cv2.imencode(".jpg", cv2.resize(img, (args.scan_size, args.scan_size)))[1].tobytes()
+        for img in images[:8]
+    ]
+
+    first = timed_calls(lambda i: pipeline.backend.predict(images[:1]), 1)[0]
+    cold_start = time.time()
+
+    start = time.perf_counter()
+    pipeline.backend.warmup(sorted(set(args.batch_sizes)))
+    warmup_s = time.perf_counter() - start
+
+    results = {
+        "name": args.backend,
+        "backend": pipeline.backend.name,
+        "model": args.model,
+        "load_s": load_s,
+        "first_call_ms": first * 1000,
+        "warmup_s": warmup_s,
+    }
+
+    results["single"] = percentiles(timed_calls(
+        lambda i: pipeline.backend.predict(images[i % len(images)][None]), args.repeat
+    ))
+
+    for bs in args.batch_sizes:
+        batch = images[:bs]
+        pipeline.backend.predict(batch)  # shape warm-up for backends that resize inputs
+        repeat = max(3, args.repeat // bs)
+        lat = timed_calls(lambda i: pipeline.backend.predict(batch), repeat)
+        results[f"batch_{bs}"] = dict(
+            percentiles(lat), images_per_s=bs * repeat / sum(lat)
+        )
+
+    # the artifacts written by predict() go to a scratch directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            tumours = 0
+            def e2e(i):
+                nonlocal tumours
+                tumours += pipeline.predict(jpegs[i % len(jpegs)])[0]["prediction"] == "Tumor"
+            results["end_to_end"] = dict(
+                percentiles(timed_calls(e2e, args.repeat)), tumour_fraction=tumours / args.repeat
+            )
+        finally:
+            os.chdir(cwd)
+
+    if pipeline.backend.keras_model is not None or os.path.exists(args.gradcam_model):
+        x = images[:1]
+        cls = np.ones(1, dtype=np.int32)
+        gradcam_first = timed_calls(lambda i: pipeline.compute_cams(x, cls), 1)[0]
+        results["gradcam"] = dict(
+            percentiles(timed_calls(
+                lambda i: pipeline.compute_cams(images[i % len(images)][None], cls), args.repeat
+            )),
+            first_call_ms=gradcam_first * 1000,
+        )
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps({"cold_start_wall": cold_start, "results": results}), flush=True)
+
+
+def default_models():
+    """model path per backend: config.yaml's prediction model and the exported ones"""
+    from KidneyClassification.config.configuration import ConfigurationManager
+
+    manager = ConfigurationManager()
+    export = manager.get_model_export_config()
+    keras_model = str(manager.get_prediction_config().model_path)
+    return {
+        "keras": keras_model,
+        "saved_model": str(export.saved_model_path),
+        "tflite": str(export.tflite_model_path),
+        "onnx": str(export.onnx_model_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="*", choices=BACKENDS, default=None,
+                        help="defaults to every backend whose model file exists")
+    parser.add_argument("--model", default=None, help="model path (only with a single backend)")
+    parser.add_argument("--gradcam-model", default=None, help="Keras model for Grad-CAM, defaults to the keras model")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=100, help="timed calls per measurement")
+    parser.add_argument("--scan-size", type=int, default=512, help="side of the synthetic JPEG scans")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results file")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        return run_child(args)
+
+    models = default_models()
+    if args.model:
+        if not args.backends or len(args.backends) != 1:
+            parser.error("--model needs exactly one --backends entry")
+        models[args.backends[0]] = args.model
+    if not os.path.exists(models["keras"]):
+        from training_mode_bench import build_random_model
+
+        models["keras"] = os.path.join(tempfile.gettempdir(), "bench_model.h5")
+        print(f"model not found, benchmarking a randomly initialised one ({models['keras']})")
+        build_random_model(models["keras"])
+    gradcam_model = args.gradcam_model or models["keras"]
+
+    backends = args.backends or [b for b in BACKENDS if os.path.exists(models[b])]
+    results = []
+    for backend in backends:
+        cmd = [
+            sys.executable, __file__, "--backend", backend, "--model", models[backend],
+            "--gradcam-model", gradcam_model, "--repeat", str(args.repeat),
+            "--scan-size", str(args.scan_size), "--seed", str(args.seed),
+            "--batch-sizes", *map(str, args.batch_sizes),
+        ]
+        spawned = time.time()
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr[-2000:]}")
+            continue
+        out = read_result(proc.stdout.splitlines())
+        r = out["results"]
+        r["cold_start_s"] = out["cold_start_wall"] - spawned
+        results.append(r)
+
+        single = r["single"]
+        print(
+            f"{backend:>12}: cold start {r['cold_start_s']:6.2f} s  "
+            f"single p50 {single['p50_ms']:7.2f} p95 {single['p95_ms']:7.2f} p99 {single['p99_ms']:7.2f} ms  "
+            f"peak RSS {r['peak_rss_mb']:7.0f} MB"
+        )
+        for bs in args.batch_sizes:
+            print(f"{'':>12}  batch {bs:3d}: {r[f'batch_{bs}']['images_per_s']:8.1f} img/s")
+        if "gradcam" in r:
+            print(f"{'':>12}  Grad-CAM p50 {r['gradcam']['p50_ms']:7.2f} ms (first {r['gradcam']['first_call_ms']:.0f} ms)")
+
+    write_results(args.output, "inference", args, results)
+
+
+if __name__ == "__main__":
+    main()
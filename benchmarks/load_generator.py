@@ -0,0 +1,210 @@
+"""
+Load generator: drives POST /predict of a running app at a fixed concurrency.
+
+Logs in once (the session cookie is shared by every client thread, so the
+login rate limit is not hit), waits for /readyz, then keeps --concurrency
+requests in flight until --requests have been sent or --duration seconds
+have passed. A request counts as successful only when the response body
+says {"status": "success"}. Prints throughput, p50/p95/p99 latency of the
+successful requests and the mix of outcomes, and writes them as JSON
+with --output (see bench_results.py).
+
+    python app.py &
+    python benchmarks/load_generator.py --concurrency 8 --requests 500 --output bench/load.json
+
+With --distinct-images every request sends a new synthetic scan, so the
+prediction cache never answers; by default --pool-size scans are reused.
+"""
+import argparse
+import base64
+import http.client
+import json
+import threading
+import time
+from collections import Counter
+from itertools import count
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from bench_results import write_results
+from inference_bench import percentiles
+
+
+class Client:
+    """one keep-alive connection per thread"""
+
+    def __init__(self, url, cookie=None, timeout=120):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookie = cookie
+        self.timeout = timeout
+        self._conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers=headers)
+                resp = self._conn.getresponse()
+                return resp, resp.read()
+            except (http.client.HTTPException, ConnectionError):
+                # server closed the keep-alive connection: reconnect once
+                self._conn.close()
+                self._conn = None
+                if attempt:
+                    raise
+
+
+def login(url, username, password) -> str:
+    resp, _ = Client(url).request(
+        "POST", "/login",
+        body=urlencode({"username": username, "password": password}),
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    cookie = resp.getheader("Set-Cookie")
+    location = resp.getheader("Location") or ""
+    if resp.status != 302 or not cookie or location.rstrip("/").endswith("/login"):
+        raise SystemExit(f"login as {username!r} failed (HTTP {resp.status})")
+    return cookie.split(";", 1)[0]
+
+
+def wait_ready(url, timeout):
+    client = Client(url)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            resp, _ = client.request("GET", "/readyz")
+            if resp.status == 200:
+                return
+        except OSError:
+            pass
+        if time.time() > deadline:
+            raise SystemExit(f"{url} not ready after {timeout} s")
+        time.sleep(1.0)
+
+
+def outcome(http_status, body) -> str:
+    """
+    "success", or what went wrong. /predict also answers 200 with
+    {"status": "error"} (e.g. a failed prediction), so the body decides.
+    """
+    try:
+        status = json.loads(body).get("status")
+    except (ValueError, AttributeError):
+        status = None
+    if http_status == 200 and status == "success":
+        return "success"
+    return f"{http_status}:{status or 'invalid'}"
+
+
+def synthetic_scans(n, size, seed):
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        img = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        yield base64.b64encode(cv2.imencode(".jpg", img)[1].tobytes()).decode()
+
+
+def run(args, cookie):
+    if args.distinct_images:
+        # pre-encode so the generator is never the bottleneck
+        pool = list(synthetic_scans(args.requests or 10000, args.scan_size, args.seed))
+    else:
+        pool = list(synthetic_scans(args.pool_size, args.scan_size, args.seed))
+    bodies = [json.dumps({"image": image}).encode() for image in pool]
+
+    counter = count()
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    deadline = time.time() + args.duration if args.duration else None
+
+    def worker():
+        client = Client(args.url, cookie)
+        while True:
+            i = next(counter)
+            if (args.requests and i >= args.requests) or (deadline and time.time() > deadline):
+                return
+            start = time.perf_counter()
+            try:
+                resp, body = client.request(
+                    "POST", "/predict", body=bodies[i % len(bodies)],
+                    headers={"Content-Type": "application/json"},
+                )
+                status = outcome(resp.status, body)
+            except OSError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] += 1
+                if status == "success":
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    total = sum(statuses.values())
+    result = {
+        "name": f"predict_c{args.concurrency}",
+        "concurrency": args.concurrency,
+        "requests": total,
+        "errors": total - statuses.get("success", 0),
+        "statuses": dict(statuses),
+        "wall_s": wall,
+        "requests_per_s": len(latencies) / wall if wall else 0.0,
+    }
+    if latencies:
+        result.update(percentiles(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[8],
+                        help="one run per value, e.g. --concurrency 1 4 16")
+    parser.add_argument("--requests", type=int, default=500, help="requests per run (0 = use --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds per run")
+    parser.add_argument("--pool-size", type=int, default=32, help="distinct scans cycled through")
+    parser.add_argument("--distinct-images", action="store_true", help="never repeat a scan (no cache hits)")
+    parser.add_argument("--scan-size", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    parser.add_argument("--output", default=None, help="JSON results file")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("set --requests or --duration")
+
+    wait_ready(args.url, args.ready_timeout)
+    cookie = login(args.url, args.username, args.password)
+
+    results = []
+    for concurrency in args.concurrency:
+        r = run(argparse.Namespace(**dict(vars(args), concurrency=concurrency)), cookie)
+        results.append(r)
+        latency = (
+            f"p50 {r['p50_ms']:7.1f}  p95 {r['p95_ms']:7.1f}  p99 {r['p99_ms']:7.1f} ms"
+            if "p50_ms" in r else "no successful requests"
+        )
+        print(
+            f"concurrency {concurrency:3d}: {r['requests_per_s']:7.1f} req/s  {latency}  "
+            f"errors {r['errors']} {r['statuses']}"
+        )
+
+    write_results(args.output, "load", args, results)
+
+
+if __name__ == "__main__":
+    main()
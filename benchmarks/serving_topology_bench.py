@@ -0,0 +1,171 @@
+"""
+Benchmark: N web workers with their own model vs N workers sharing one
+model server.
+
+  * in_process   - every worker process loads its own PredictionPipeline
+  * model_server - one pipeline/model_server.py process, workers use the
+                   remote backend over its Unix socket
+
+Each worker sends --requests single-image forward passes from --threads
+threads once every worker is loaded. Prints throughput, p50/p95 latency
+and the summed resident memory of all processes for each topology.
+
+    python benchmarks/serving_topology_bench.py --workers 4 --threads 4 --model model/model.h5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+from bench_results import read_result
+
+TOPOLOGIES = ["in_process", "model_server"]
+
+
+def rss_mb(pid="self"):
+    """current resident set size from /proc (Linux)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_worker(args):
+    import numpy as np
+    from KidneyClassification.config.configuration import ConfigurationManager
+    from KidneyClassification.pipeline.prediction import PredictionPipeline
+
+    config = replace(
+        ConfigurationManager().get_prediction_config(),
+        model_path=Path(args.model),
+        backend="remote" if args.topology == "model_server" else "auto",
+        model_server=args.address,
+        max_batch_size=args.max_batch_size,
+        cache_size=0,
+        warmup=True,
+    )
+    pipeline = PredictionPipeline(None, config=config)
+
+    rng = np.random.default_rng(os.getpid())
+    images = rng.integers(0, 256, (8, 224, 224, 3), dtype=np.uint8)
+
+    def one(i):
+        start = time.perf_counter()
+        pipeline._forward(images[i % len(images)])
+        return time.perf_counter() - start
+
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    start = time.time()
+    with ThreadPoolExecutor(args.threads) as pool:
+        latencies = list(pool.map(one, range(args.requests)))
+    end = time.time()
+
+    print(json.dumps({
+        "start": start, "end": end, "latencies": latencies, "rss_mb": rss_mb(),
+    }), flush=True)
+
+
+def wait_for_socket(path, proc, timeout=600):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if proc.poll() is not None or time.time() > deadline:
+            raise RuntimeError("model server did not start")
+        time.sleep(0.2)
+
+
+def run_topology(topology, args):
+    server = None
+    # mkdtemp is 0700: a private directory for the socket and its key file
+    address = os.path.join(tempfile.mkdtemp(prefix="bench_model_server_"), "server.sock")
+    if topology == "model_server":
+        server = subprocess.Popen([
+            sys.executable, "-m", "KidneyClassification.pipeline.model_server",
+            "--address", address, "--model-path", args.model,
+        ])
+        wait_for_socket(address, server)
+
+    cmd = [
+        sys.executable, __file__, "--topology", topology, "--model", args.model,
+        "--address", address, "--threads", str(args.threads),
+        "--requests", str(args.requests), "--max-batch-size", str(args.max_batch_size),
+        "--worker",
+    ]
+    workers = [
+        subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(args.workers)
+    ]
+    try:
+        for w in workers:
+            while w.stdout.readline().strip() != "ready":
+                if w.poll() is not None:
+                    raise RuntimeError("worker exited before it was ready")
+
+        # release every worker at once
+        for w in workers:
+            w.stdin.write("go\n")
+            w.stdin.flush()
+        results = [read_result(w.stdout) for w in workers]
+        server_rss = rss_mb(server.pid) if server is not None else 0.0
+    finally:
+        for w in workers:
+            w.wait()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    import numpy as np
+
+    latencies = np.concatenate([r["latencies"] for r in results]) * 1000
+    wall = max(r["end"] for r in results) - min(r["start"] for r in results)
+    return {
+        "topology": topology,
+        "requests_per_s": len(latencies) / wall,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_mb": sum(r["rss_mb"] for r in results) + server_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="model/model.h5")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="concurrent requests per worker")
+    parser.add_argument("--requests", type=int, default=200, help="requests per worker")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--topology", choices=TOPOLOGIES, nargs="*", default=TOPOLOGIES)
+    parser.add_argument("--address", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.topology = args.topology[0] if isinstance(args.topology, list) else args.topology
+        return run_worker(args)
+
+    if not os.path.exists(args.model):
+        from training_mode_bench import build_random_model
+
+        args.model = os.path.join(tempfile.gettempdir(), "bench_model.h5")
+        print(f"model not found, benchmarking a randomly initialised one ({args.model})")
+        build_random_model(args.model)
+
+    for topology in args.topology:
+        r = run_topology(topology, args)
+        print(
+            f"{r['topology']:>12}: {r['requests_per_s']:7.1f} req/s  "
+            f"p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  "
+            f"RSS {r['rss_mb']:8.0f} MB ({args.workers} workers)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: TRAINING_MODE default vs cpu_optimized.
+
+Each mode runs in its own process (thread pools and dtype policies are
+process-wide), loads the same base model through Training.get_base_model
+and fits it on synthetic batches. Prints ms/step, images/s and the projected
+epoch time for --epoch-images images.
+
+    python benchmarks/training_mode_bench.py --model artifacts/prepare_base_model/base_model_updated.h5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_results import read_result
+
+MODES = ["default", "cpu_optimized"]
+
+
+def build_random_model(path):
+    import tensorflow as tf
+    from KidneyClassification.components.prepare_base_model import PrepareBaseModel
+
+    vgg = tf.keras.applications.vgg16.VGG16(
+        input_shape=(224, 224, 3), weights=None, include_top=False
+    )
+    model = PrepareBaseModel._prepare_full_model(
+        vgg, classes=2, freeze_all=False, freeze_till=4, learning_rate=1e-4
+    )
+    model.save(path)
+
+
+def run_child(args):
+    import numpy as np
+    import tensorflow as tf
+    from KidneyClassification.components.model_training import Training
+    from KidneyClassification.entity.config_entity import TrainingConfig
+
+    config = TrainingConfig(
+        root_dir=Path(tempfile.gettempdir()),
+        trained_model_path=Path(tempfile.gettempdir()) / "bench_model.h5",
+        updated_base_model_path=Path(args.model),
+        training_data=Path("."),
+        params_epochs=1,
+        params_batch_size=args.batch_size,
+        params_is_augmentation=False,
+        params_image_size=[224, 224, 3],
+        params_data_pipeline="preprocessed",
+        params_data_cache="none",
+        preprocessed_data=Path("."),
+        params_training_mode=args.mode,
+        params_intra_op_threads=0,
+        params_inter_op_threads=0,
+        profile_dir=Path(tempfile.gettempdir()) / "bench_profile",
+        profile_summary=Path(tempfile.gettempdir()) / "bench_training_profile.json",
+        params_profile_training=False,
+        params_profile_steps=[0, 0]
+    )
+    training = Training(config)
+    training.configure_runtime()
+    training.get_base_model()
+
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 256, (args.batch_size, 224, 224, 3)).astype("float32")
+    y = tf.one_hot(rng.integers(0, 2, args.batch_size), 2)
+    ds = tf.data.Dataset.from_tensors((x, y)).repeat()
+
+    # warm-up covers tracing / XLA compilation
+    training.model.fit(ds, epochs=1, steps_per_epoch=args.warmup, verbose=0)
+    start = time.perf_counter()
+    training.model.fit(ds, epochs=1, steps_per_epoch=args.steps, verbose=0)
+    elapsed = time.perf_counter() - start
+
+    step_ms = elapsed / args.steps * 1000
+    print(json.dumps({
+        "mode": args.mode,
+        "policy": training.policy,
+        "step_ms": step_ms,
+        "images_per_s": args.batch_size * args.steps / elapsed,
+        "epoch_s": step_ms / 1000 * (args.epoch_images // args.batch_size),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="artifacts/prepare_base_model/base_model_updated.h5")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--epoch-images", type=int, default=9000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_child(args)
+
+    if not os.path.exists(args.model):
+        args.model = os.path.join(tempfile.gettempdir(), "bench_base_model.h5")
+        print(f"base model not found, benchmarking a randomly initialised one ({args.model})")
+        build_random_model(args.model)
+
+    results = []
+    for mode in MODES:
+        cmd = [
+            sys.executable, __file__, "--mode", mode, "--model", args.model,
+            "--batch-size", str(args.batch_size), "--steps", str(args.steps),
+            "--warmup", str(args.warmup), "--epoch-images", str(args.epoch_images),
+        ]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(read_result(out.splitlines()))
+
+    base = results[0]["step_ms"]
+    for r in results:
+        print(
+            f"{r['mode']:>14} ({r['policy']:>14}): {r['step_ms']:8.1f} ms/step "
+            f"{r['images_per_s']:7.1f} img/s  epoch ~{r['epoch_s']:7.1f} s  "
+            f"({base / r['step_ms']:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
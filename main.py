@@ -1,8 +1,10 @@
 from KidneyClassification import logger
 from KidneyClassification.pipeline.stage01_data_ingestion import DataIngestionTrainingPipeline
+from KidneyClassification.pipeline.stage_02_data_preprocessing import DataPreprocessingPipeline
 from KidneyClassification.pipeline.stage_02_prepare_base_model import PrepareBaseModelTrainingPipeline
 from KidneyClassification.pipeline.stage_03_model_training import ModelTrainingPipeline   
 from KidneyClassification.pipeline.stage_04_model_evaluation import EvaluationPipeline  
+from KidneyClassification.pipeline.stage_05_model_export import ModelExportPipeline
 
 
 
@@ -18,6 +20,18 @@ if __name__ == "__main__":
         raise e
     
 
+STAGE_NAME="Data Preprocessing Stage"
+if __name__ == "__main__":
+    try:
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = DataPreprocessingPipeline()
+        obj.main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
+
+
 STAGE_NAME="Prepare Base Model Stage"
 if __name__ == "__main__":
     try:
@@ -55,4 +69,17 @@ if __name__ == "__main__":
         logger.info(f">>>>> stage {STAGE_NAME} completed <<<<<\n\nx=========x")
     except Exception as e:
         logger.exception(e)
-        raise e
\ No newline at end of file
+        raise e
+
+
+STAGE_NAME = "Model Export stage"
+if __name__ == "__main__":
+    try:
+        logger.info(f"***************")
+        logger.info(f">>>>> stage {STAGE_NAME} started <<<<<")
+        obj = ModelExportPipeline()
+        obj.main()
+        logger.info(f">>>>> stage {STAGE_NAME} completed <<<<<\n\nx=========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import tensorflow as tf
+from KidneyClassification import logger
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+
+class ImageDataPipeline:
+    """
+    tf.data replacement for ImageDataGenerator.flow_from_directory.
+
+    Decodes in parallel, caches the decoded + resized uint8 tensors after the
+    first epoch (in memory or in a file cache), augments whole batches with
+    Keras preprocessing layers and prefetches. The train/validation split is
+    the same deterministic per-class split flow_from_directory makes: files
+    are sorted and the first `validation_split` fraction of each class is
+    the validation subset.
+    """
+
+    def __init__(self, directory: Path, image_size: list, batch_size: int,
+                 validation_split: float, cache: str = "memory",
+                 cache_dir: Path = None, seed: int = 42):
+        self.directory = Path(directory)
+        self.image_size = tuple(image_size[:2])
+        self.batch_size = batch_size
+        self.validation_split = validation_split
+        self.cache = (cache or "none").lower()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.seed = seed
+        self.class_names = self._class_names()
+
+    def _class_names(self) -> list:
+        return sorted(d.name for d in self.directory.iterdir() if d.is_dir())
+
+    def list_files(self, subset: str):
+        """(paths, class indices) for 'training' or 'validation', in class/file order"""
+        paths, labels = [], []
+        for idx, name in enumerate(self.class_names):
+            files = sorted(
+                f for f in os.listdir(self.directory / name)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            n_valid = int(self.validation_split * len(files))
+            chosen = files[:n_valid] if subset == "validation" else files[n_valid:]
+            paths += [str(self.directory / name / f) for f in chosen]
+            labels += [idx] * len(chosen)
+        return paths, labels
+
+    def _decode(self, path, label):
+        img = tf.io.decode_image(
+            tf.io.read_file(path), channels=3, expand_animations=False
+        )
+        img = tf.image.resize(img, self.image_size, method="bilinear")
+        img = tf.cast(tf.round(img), tf.uint8)
+        return img, tf.one_hot(label, len(self.class_names))
+
+    def _fingerprint(self, paths, labels) -> str:
+        """digest of the files (path, size, mtime), their labels, the classes and the image size"""
+        h = hashlib.blake2b(digest_size=12)
+        h.update(json.dumps([self.class_names, self.image_size]).encode())
+        for path, label in zip(paths, labels):
+            st = os.stat(path)
+            h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0{label}\n".encode())
+        return h.hexdigest()
+
+    def _cached(self, ds, subset: str, paths, labels):
+        if self.cache == "memory":
+            return ds.cache()
+        if self.cache == "file":
+            # keyed by the exact file list, so adding, removing or relabelling
+            # images (or changing the split) never replays stale tensors
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            name = f"{subset}_{self._fingerprint(paths, labels)}"
+            for old in self.cache_dir.glob(f"{subset}_*"):
+                if not old.name.startswith(name):
+                    logger.info(f"removing stale tf.data cache file: {old}")
+                    old.unlink()
+            return ds.cache(str(self.cache_dir / name))
+        return ds
+
+    @staticmethod
+    def augmentation() -> tf.keras.Sequential:
+        """Keras-layer equivalent of the ImageDataGenerator augmentation we used"""
+        layers = [
+            tf.keras.layers.RandomRotation(40 / 360, fill_mode="nearest"),
+            tf.keras.layers.RandomFlip("horizontal"),
+            tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode="nearest"),
+            tf.keras.layers.RandomZoom(0.2, fill_mode="nearest"),
+        ]
+        # RandomShear only exists in newer Keras 3 releases
+        if hasattr(tf.keras.layers, "RandomShear"):
+            layers.append(tf.keras.layers.RandomShear(x_factor=0.2, y_factor=0.2, fill_mode="nearest"))
+        return tf.keras.Sequential(layers, name="augmentation")
+
+    def _source(self, subset: str):
+        """(dataset of (uint8 image, one-hot label), number of samples)"""
+        paths, labels = self.list_files(subset)
+        logger.info(
+            f"tf.data {subset}: {len(paths)} images belonging to {len(self.class_names)} classes"
+        )
+
+        ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+        ds = ds.map(self._decode, num_parallel_calls=tf.data.AUTOTUNE)
+        return self._cached(ds, subset, paths, labels), len(paths)
+
+    def _finish(self, ds, augment: bool, rescale: bool):
+        """uint8 batches -> float32 (optionally / 255), augmented, prefetched"""
+        scale = 1.0 / 255.0 if rescale else 1.0
+        ds = ds.map(
+            lambda x, y: (tf.cast(x, tf.float32) * scale, y),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        if augment:
+            aug = self.augmentation()
+            ds = ds.map(
+                lambda x, y: (aug(x, training=True), y),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        return ds.prefetch(tf.data.AUTOTUNE)
+
+    def dataset(self, subset: str, shuffle: bool = False, augment: bool = False,
+                repeat: bool = False, rescale: bool = True):
+        """
+        Returns (dataset, number of samples). Batches are float32 with one-hot
+        labels; pixels are in [0, 1] like the ImageDataGenerator batches they
+        replace, or left in [0, 255] with rescale=False for models that
+        normalise in-graph.
+        """
+        ds, n = self._source(subset)
+
+        if shuffle:
+            ds = ds.shuffle(n, seed=self.seed, reshuffle_each_iteration=True)
+        if repeat:
+            ds = ds.repeat()
+        ds = ds.batch(self.batch_size, num_parallel_calls=tf.data.AUTOTUNE)
+
+        return self._finish(ds, augment, rescale), n
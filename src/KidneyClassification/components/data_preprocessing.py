@@ -0,0 +1,176 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from KidneyClassification import logger
+from KidneyClassification.components.data_pipeline import ImageDataPipeline
+from KidneyClassification.entity.config_entity import DataPreprocessingConfig
+
+
+INDEX_FILE = "index.json"
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+
+
+class DataPreprocessing:
+    """
+    Decode + resize the raw CT scans once into a memory-mapped uint8 store.
+
+    Output layout (root_dir):
+        index.json    image size, resize method, class names and one record
+                      per image (source path, label); record i is row i of
+                      the arrays
+        images.npy    uint8 (N, H, W, 3), written through np.lib.format.open_memmap
+        labels.npy    int32 (N,)
+
+    images.npy is opened read-only with mmap_mode="r" by every reader, so
+    training, evaluation and any number of worker processes share the same
+    page-cache pages instead of each holding a private float copy. Pixels
+    stay uint8 on disk and in the input pipeline; scaling to [0, 1] happens
+    inside the model (see PrepareBaseModel._prepare_full_model).
+    """
+
+    def __init__(self, config: DataPreprocessingConfig):
+        self.config = config
+
+    def preprocess(self):
+        image_size = self.config.params_image_size
+        h, w = image_size[:2]
+        # validation_split=0 -> every image, in the per-class sorted order
+        source = ImageDataPipeline(
+            directory=self.config.source_dir,
+            image_size=image_size,
+            batch_size=self.config.chunk_size,
+            validation_split=0.0,
+            cache="none"
+        )
+        paths, labels = source.list_files("training")
+
+        root_dir = Path(self.config.root_dir)
+        # stale arrays from a previous image size must not survive
+        shutil.rmtree(root_dir, ignore_errors=True)
+        root_dir.mkdir(parents=True, exist_ok=True)
+
+        images = np.lib.format.open_memmap(
+            root_dir / IMAGES_FILE, mode="w+", dtype=np.uint8,
+            shape=(len(paths), h, w, 3)
+        )
+        np.save(root_dir / LABELS_FILE, np.asarray(labels, dtype=np.int32))
+
+        # decode in parallel, write chunk by chunk straight into the memmap
+        ds = (
+            tf.data.Dataset.from_tensor_slices((paths, labels))
+            .map(source._decode, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+            .map(lambda img, _: img)
+            .batch(self.config.chunk_size)
+            .prefetch(1)
+        )
+        start = 0
+        for chunk in ds:
+            images[start:start + len(chunk)] = chunk.numpy()
+            start += len(chunk)
+            logger.info(f"stored {start}/{len(paths)} images")
+        images.flush()
+        del images
+
+        index = {
+            "image_size": [h, w],
+            "resize": "bilinear",  # ImageDataPipeline._decode
+            "class_names": source.class_names,
+            "records": [
+                {"path": str(Path(p).relative_to(self.config.source_dir)), "label": l}
+                for p, l in zip(paths, labels)
+            ],
+        }
+        with open(root_dir / INDEX_FILE, "w") as f:
+            json.dump(index, f)
+
+        logger.info(f"preprocessed {len(paths)} images into {root_dir}")
+
+
+class PreprocessedDataPipeline(ImageDataPipeline):
+    """
+    ImageDataPipeline that reads the DataPreprocessing memmap instead of
+    decoding JPEGs. Same split, batching and augmentation; batches are
+    gathered from the memmap by index, so only the rows of the current
+    batch are ever materialised.
+    """
+
+    def __init__(self, directory: Path, image_size: list, batch_size: int,
+                 validation_split: float, seed: int = 42):
+        self.index = self.load_index(directory, image_size)
+        super().__init__(
+            directory, image_size, batch_size, validation_split,
+            cache="none", seed=seed
+        )
+        self.images = np.load(Path(directory) / IMAGES_FILE, mmap_mode="r")
+        self.labels = np.load(Path(directory) / LABELS_FILE)
+
+    @staticmethod
+    def load_index(directory: Path, image_size: list) -> dict:
+        with open(Path(directory) / INDEX_FILE) as f:
+            index = json.load(f)
+        if list(index["image_size"]) != list(image_size[:2]):
+            raise ValueError(
+                f"preprocessed data in {directory} is {index['image_size']}, "
+                f"expected {list(image_size[:2])}; re-run the data_preprocessing stage"
+            )
+        return index
+
+    def _class_names(self) -> list:
+        return self.index["class_names"]
+
+    def rows(self, subset: str) -> np.ndarray:
+        """row numbers of the subset, split per class like flow_from_directory"""
+        labels = np.array([r["label"] for r in self.index["records"]])
+        chosen = []
+        for idx in range(len(self.class_names)):
+            class_rows = np.flatnonzero(labels == idx)
+            n_valid = int(self.validation_split * len(class_rows))
+            chosen.append(class_rows[:n_valid] if subset == "validation" else class_rows[n_valid:])
+        return np.concatenate(chosen) if chosen else np.array([], dtype=np.int64)
+
+    def list_files(self, subset: str):
+        records = self.index["records"]
+        rows = self.rows(subset)
+        return [records[i]["path"] for i in rows], [records[i]["label"] for i in rows]
+
+    def gather(self, rows) -> np.ndarray:
+        """uint8 images for the given rows (sorted reads keep the memmap access sequential)"""
+        rows = np.asarray(rows)
+        order = np.argsort(rows)
+        out = np.empty((len(rows),) + self.images.shape[1:], dtype=np.uint8)
+        out[order] = self.images[rows[order]]
+        return out
+
+    def dataset(self, subset: str, shuffle: bool = False, augment: bool = False,
+                repeat: bool = False, rescale: bool = True):
+        rows = self.rows(subset)
+        logger.info(
+            f"preprocessed {subset}: {len(rows)} images belonging to {len(self.class_names)} classes"
+        )
+        num_classes = len(self.class_names)
+        h, w = self.image_size
+
+        def load_batch(batch_rows):
+            batch_rows = batch_rows.numpy()
+            return self.gather(batch_rows), self.labels[batch_rows]
+
+        def to_batch(batch_rows):
+            images, labels = tf.py_function(
+                load_batch, [batch_rows], (tf.uint8, tf.int32)
+            )
+            images.set_shape((None, h, w, 3))
+            labels.set_shape((None,))
+            return images, tf.one_hot(labels, num_classes)
+
+        ds = tf.data.Dataset.from_tensor_slices(rows)
+        if shuffle:
+            ds = ds.shuffle(len(rows), seed=self.seed, reshuffle_each_iteration=True)
+        if repeat:
+            ds = ds.repeat()
+        ds = ds.batch(self.batch_size).map(to_batch, num_parallel_calls=tf.data.AUTOTUNE)
+
+        return self._finish(ds, augment, rescale), len(rows)
@@ -1,10 +1,13 @@
+import json
 import tensorflow as tf
 from pathlib import Path
 import mlflow
 import mlflow.keras
 from urllib.parse import urlparse
 from KidneyClassification.entity.config_entity import EvaluationConfig
-from KidneyClassification.utils.common import save_json
+from KidneyClassification.utils.common import save_json, model_rescales_input
+from KidneyClassification.components.data_pipeline import ImageDataPipeline
+from KidneyClassification.components.data_preprocessing import PreprocessedDataPipeline
 
 
 class Evaluation:
@@ -13,9 +16,32 @@ class Evaluation:
 
     
     def _valid_generator(self):
+        rescale = not model_rescales_input(self.model)
+
+        if self.config.params_data_pipeline == "preprocessed":
+            data = PreprocessedDataPipeline(
+                directory=self.config.preprocessed_data,
+                image_size=self.config.params_image_size,
+                batch_size=self.config.params_batch_size,
+                validation_split=0.30
+            )
+            self.valid_generator, _ = data.dataset("validation", rescale=rescale)
+            return
+
+        if self.config.params_data_pipeline == "tf_data":
+            data = ImageDataPipeline(
+                directory=self.config.training_data,
+                image_size=self.config.params_image_size,
+                batch_size=self.config.params_batch_size,
+                validation_split=0.30,
+                cache=self.config.params_data_cache,
+                cache_dir=Path(self.config.path_of_model).parent / "tfdata_cache"
+            )
+            self.valid_generator, _ = data.dataset("validation", rescale=rescale)
+            return
 
         datagenerator_kwargs = dict(
-            rescale = 1./255,
+            rescale = 1./255 if rescale else None,
             validation_split=0.30
         )
 
@@ -61,6 +87,11 @@ class Evaluation:
             mlflow.log_metrics(
                 {"loss": self.score[0], "accuracy": self.score[1]}
             )
+            # training efficiency of the run that produced this model
+            if Path(self.config.training_profile).exists():
+                with open(self.config.training_profile) as f:
+                    profile = json.load(f)
+                mlflow.log_metrics({f"train_{k}": v for k, v in profile.items()})
             # Model registry does not work with file store
             if tracking_url_type_store != "file":
 
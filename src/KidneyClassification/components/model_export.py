@@ -0,0 +1,156 @@
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from KidneyClassification import logger
+from KidneyClassification.components.data_preprocessing import PreprocessedDataPipeline
+from KidneyClassification.entity.config_entity import ModelExportConfig
+from KidneyClassification.utils.common import model_rescales_input, save_json
+
+
+class ModelExport:
+    """
+    Post-training export of the trained Keras model for serving.
+
+    * TFLite, dynamic-range (QUANTIZATION: dynamic) or full-integer
+      (QUANTIZATION: int8, calibrated on CALIBRATION_SAMPLES training images)
+    * SavedModel with a raw-pixel serving_default signature
+    * optionally ONNX (EXPORT_ONNX: True, needs tf2onnx)
+
+    Exported models always take raw [0, 255] float32 pixels, whatever the
+    Keras model expects. evaluate() scores every exported model on the
+    evaluation split and writes accuracy delta, size and latency to
+    export_scores.json.
+    """
+
+    def __init__(self, config: ModelExportConfig):
+        self.config = config
+        self.model = tf.keras.models.load_model(self.config.path_of_model)
+        self.data = PreprocessedDataPipeline(
+            directory=self.config.preprocessed_data,
+            image_size=self.config.params_image_size,
+            batch_size=1,
+            validation_split=0.30
+        )
+
+    def _serving_model(self) -> tf.keras.Model:
+        if model_rescales_input(self.model):
+            return self.model
+        # older models expect [0, 1]; bake the scaling into the exported graph
+        inputs = tf.keras.Input(shape=self.model.input_shape[1:], name="image")
+        x = tf.keras.layers.Rescaling(1. / 255, name="rescaling")(inputs)
+        return tf.keras.Model(inputs, self.model(x))
+
+    def _calibration_data(self):
+        rows = self.data.rows("training")
+        rng = np.random.default_rng(0)
+        n = min(self.config.params_calibration_samples, len(rows))
+        for row in rng.choice(rows, size=n, replace=False):
+            yield [self.data.gather([row]).astype(np.float32)]
+
+    def export_tflite(self) -> Path:
+        converter = tf.lite.TFLiteConverter.from_keras_model(self._serving_model())
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if self.config.params_quantization == "int8":
+            converter.representative_dataset = self._calibration_data
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            # int8 internally, float32 in/out so callers keep the same contract
+
+        tflite_model = converter.convert()
+        path = Path(self.config.tflite_model_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(tflite_model)
+        logger.info(f"{self.config.params_quantization} TFLite model saved at: {path}")
+        return path
+
+    def export_saved_model(self) -> Path:
+        model = self._serving_model()
+        spec = tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="image")
+        serve = tf.function(lambda image: {"probabilities": model(image, training=False)})
+        path = Path(self.config.saved_model_path)
+        tf.saved_model.save(
+            model, str(path),
+            signatures={"serving_default": serve.get_concrete_function(spec)}
+        )
+        logger.info(f"SavedModel saved at: {path}")
+        return path
+
+    def export_onnx(self):
+        if not self.config.params_export_onnx:
+            return None
+        try:
+            import tf2onnx
+        except ImportError:
+            logger.warning("EXPORT_ONNX is set but tf2onnx is not installed, skipping ONNX export")
+            return None
+
+        model = self._serving_model()
+        spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="image"),)
+        path = Path(self.config.onnx_model_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=str(path))
+        logger.info(f"ONNX model saved at: {path}")
+        return path
+
+    def _score(self, predict_one) -> dict:
+        rows = self.data.rows("validation")
+        correct, latencies = 0, []
+        for row in rows:
+            x = self.data.gather([row]).astype(np.float32)
+            start = time.perf_counter()
+            probs = predict_one(x)
+            latencies.append(time.perf_counter() - start)
+            correct += int(np.argmax(probs) == self.data.labels[row])
+        return {
+            "accuracy": correct / max(len(rows), 1),
+            "latency_ms": float(np.median(latencies) * 1000) if latencies else None,
+        }
+
+    def evaluate(self, tflite_path: Path, onnx_path: Path = None):
+        keras_model = self._serving_model()
+        keras = self._score(lambda x: keras_model(x, training=False).numpy())
+
+        interpreter = tf.lite.Interpreter(model_path=str(tflite_path))
+        interpreter.allocate_tensors()
+        inp = interpreter.get_input_details()[0]["index"]
+        out = interpreter.get_output_details()[0]["index"]
+
+        def tflite_predict(x):
+            interpreter.set_tensor(inp, x)
+            interpreter.invoke()
+            return interpreter.get_tensor(out)
+
+        tflite = self._score(tflite_predict)
+
+        scores = {
+            "quantization": self.config.params_quantization,
+            "keras_accuracy": keras["accuracy"],
+            "keras_latency_ms": keras["latency_ms"],
+            "keras_size_mb": os.path.getsize(self.config.path_of_model) / 2**20,
+            "tflite_accuracy": tflite["accuracy"],
+            "tflite_accuracy_delta": tflite["accuracy"] - keras["accuracy"],
+            "tflite_latency_ms": tflite["latency_ms"],
+            "tflite_size_mb": os.path.getsize(tflite_path) / 2**20,
+        }
+
+        if onnx_path is not None:
+            try:
+                import onnxruntime as ort
+            except ImportError:
+                logger.warning("onnxruntime is not installed, ONNX model not scored")
+            else:
+                session = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+                name = session.get_inputs()[0].name
+                onnx = self._score(lambda x: session.run(None, {name: x})[0])
+                scores.update({
+                    "onnx_accuracy": onnx["accuracy"],
+                    "onnx_accuracy_delta": onnx["accuracy"] - keras["accuracy"],
+                    "onnx_latency_ms": onnx["latency_ms"],
+                    "onnx_size_mb": os.path.getsize(onnx_path) / 2**20,
+                })
+
+        save_json(path=Path(self.config.scores_path), data=scores)
+        return scores
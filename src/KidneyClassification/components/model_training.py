@@ -2,14 +2,112 @@ import os
 import urllib.request as request
 from zipfile import ZipFile
 import time
+import numpy as np
 import tensorflow as tf
 from pathlib import Path
+from KidneyClassification import logger
 from KidneyClassification.entity.config_entity import TrainingConfig
+from KidneyClassification.utils.common import model_rescales_input, save_json
+from KidneyClassification.components.data_pipeline import ImageDataPipeline
+from KidneyClassification.components.data_preprocessing import PreprocessedDataPipeline
+
+
+class StepTimer(tf.keras.callbacks.Callback):
+    """
+    Wall time of every training step (on_train_batch_begin -> end) and of
+    the host-side gap before it (previous step end -> begin). The first
+    step of the run, which includes tracing / XLA compilation, is kept apart.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.first_step_s = None
+        self.step_s = []
+        self.gap_s = []
+        self.epoch_s = []
+        self._last_end = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._last_end = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_s.append(time.perf_counter() - self._epoch_start)
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._begin = time.perf_counter()
+        if self._last_end is not None:
+            self.gap_s.append(self._begin - self._last_end)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._last_end = time.perf_counter()
+        elapsed = self._last_end - self._begin
+        if self.first_step_s is None:
+            self.first_step_s = elapsed
+        else:
+            self.step_s.append(elapsed)
 
 
 class Training:
     def __init__(self, config: TrainingConfig):
         self.config = config
+        self.policy = "float32"
+
+
+    @staticmethod
+    def cpu_supports_bf16() -> bool:
+        """bfloat16 only pays off on CPUs with native bf16 dot products (AVX512_BF16 / AMX)"""
+        try:
+            with open("/proc/cpuinfo") as f:
+                flags = f.read()
+        except OSError:
+            return False
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+
+    def configure_runtime(self):
+        """
+        TRAINING_MODE: cpu_optimized -> explicit intra/inter-op thread pools and
+        bfloat16 mixed precision where the CPU supports it. Must run before
+        TensorFlow executes its first op (thread pools are fixed after that).
+        """
+        if self.config.params_training_mode != "cpu_optimized":
+            return
+
+        intra = self.config.params_intra_op_threads or os.cpu_count()
+        inter = self.config.params_inter_op_threads or 2
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+            logger.info(f"thread pools: intra_op={intra}, inter_op={inter}")
+        except RuntimeError as e:
+            logger.warning(f"could not set thread pools, TensorFlow already initialised: {e}")
+
+        if self.cpu_supports_bf16():
+            self.policy = "mixed_bfloat16"
+        else:
+            logger.warning("CPU has no native bfloat16 support, training in float32")
+        logger.info(f"training dtype policy: {self.policy}")
+
+    @staticmethod
+    def with_dtype_policy(model: tf.keras.Model, policy: str) -> tf.keras.Model:
+        """
+        Rebuild a functional model under `policy`, keeping its weights. The
+        softmax output layer always stays float32 so probabilities and the loss
+        are computed at full precision.
+        """
+        config = model.get_config()
+        outputs = config["output_layers"]
+        if outputs and isinstance(outputs[0], str):  # single output: [name, node, tensor]
+            outputs = [outputs]
+        output_names = {out[0] for out in outputs}
+        for layer in config["layers"]:
+            if layer["class_name"] == "InputLayer":
+                continue
+            layer["config"]["dtype"] = "float32" if layer["name"] in output_names else policy
+
+        rebuilt = tf.keras.Model.from_config(config)
+        rebuilt.set_weights(model.get_weights())
+        return rebuilt
 
     
     def get_base_model(self):
@@ -17,18 +115,31 @@ class Training:
             self.config.updated_base_model_path
         )
 
+        if self.policy != "float32":
+            self.model = self.with_dtype_policy(self.model, self.policy)
+
+        optimizer = tf.keras.optimizers.SGD(learning_rate=0.01)
+        # bfloat16 has float32's exponent range and needs no loss scaling;
+        # float16 would underflow small gradients without it
+        if self.policy == "mixed_float16":
+            optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+
         # ✅ FIX: Recompile optimizer after loading the model
         self.model.compile(
-            optimizer=tf.keras.optimizers.SGD(learning_rate=0.01),
+            optimizer=optimizer,
             loss=tf.keras.losses.CategoricalCrossentropy(),
-            metrics=["accuracy"]
+            metrics=["accuracy"],
+            # XLA-compile the train step in the optimised CPU mode
+            jit_compile=self.config.params_training_mode == "cpu_optimized"
         )
 
 
     def train_valid_generator(self):
+        if self.config.params_data_pipeline in ("tf_data", "preprocessed"):
+            return self.train_valid_dataset()
 
         datagenerator_kwargs = dict(
-            rescale = 1./255,
+            rescale = None if model_rescales_input(self.model) else 1./255,
             validation_split=0.20
         )
 
@@ -68,25 +179,158 @@ class Training:
             shuffle=True,
             **dataflow_kwargs
         )
+        self.train_samples = self.train_generator.samples
+        self.valid_samples = self.valid_generator.samples
+
+
+    def train_valid_dataset(self):
+        if self.config.params_data_pipeline == "preprocessed":
+            data = PreprocessedDataPipeline(
+                directory=self.config.preprocessed_data,
+                image_size=self.config.params_image_size,
+                batch_size=self.config.params_batch_size,
+                validation_split=0.20
+            )
+        else:
+            data = ImageDataPipeline(
+                directory=self.config.training_data,
+                image_size=self.config.params_image_size,
+                batch_size=self.config.params_batch_size,
+                validation_split=0.20,
+                cache=self.config.params_data_cache,
+                cache_dir=Path(self.config.root_dir) / "tfdata_cache"
+            )
+
+        rescale = not model_rescales_input(self.model)
+        self.valid_generator, self.valid_samples = data.dataset(
+            "validation", rescale=rescale
+        )
+        # repeat() so steps_per_epoch batches are always available
+        self.train_generator, self.train_samples = data.dataset(
+            "training",
+            shuffle=True,
+            augment=self.config.params_is_augmentation,
+            repeat=True,
+            rescale=rescale
+        )
 
 
     @staticmethod
     def save_model(path: Path, model: tf.keras.Model):
         model.save(path)
 
+    # ------------------------------------------------------------
+    # Profiling (PROFILE_TRAINING)
+    # ------------------------------------------------------------
+    def profile_input_pipeline(self, steps=20, warmup=3) -> float:
+        """seconds per batch the training input pipeline needs on its own (no model)"""
+        iterator = iter(self.train_generator)
+        for _ in range(warmup):
+            next(iterator)
+        start = time.perf_counter()
+        for _ in range(steps):
+            next(iterator)
+        return (time.perf_counter() - start) / steps
+
+    def profile_compute(self, steps=20, warmup=3) -> float:
+        """
+        Seconds per training step with the input taken out: one batch held
+        in memory, repeated. Weights and optimizer state are restored
+        afterwards, so the real training run starts from the same point.
+        """
+        x, y = next(iter(self.train_generator))
+        ds = tf.data.Dataset.from_tensors((x, y)).repeat()
+
+        # create the optimizer's slot variables now so they are snapshotted too
+        if not self.model.optimizer.built:
+            self.model.optimizer.build(self.model.trainable_variables)
+        weights = self.model.get_weights()
+        optimizer_state = [v.numpy() for v in self.model.optimizer.variables]
+
+        self.model.fit(ds, epochs=1, steps_per_epoch=warmup, verbose=0)
+        timer = StepTimer()
+        self.model.fit(ds, epochs=1, steps_per_epoch=steps + 1, verbose=0, callbacks=[timer])
+
+        self.model.set_weights(weights)
+        for variable, value in zip(self.model.optimizer.variables, optimizer_state):
+            variable.assign(value)
+        return float(np.median(timer.step_s))
+
+    def profile_summary(self, timer: StepTimer, input_s=None, compute_s=None) -> dict:
+        batch_size = self.config.params_batch_size
+        step_s = np.array(timer.step_s or [timer.first_step_s or 0.0])
+        summary = {
+            "images_per_s": batch_size * len(step_s) / float(step_s.sum() + sum(timer.gap_s)),
+            "step_ms_mean": float(step_s.mean() * 1000),
+            "step_ms_p50": float(np.percentile(step_s, 50) * 1000),
+            "step_ms_p95": float(np.percentile(step_s, 95) * 1000),
+            "first_step_ms": (timer.first_step_s or 0.0) * 1000,
+            "host_gap_ms_mean": float(np.mean(timer.gap_s) * 1000) if timer.gap_s else 0.0,
+            "epoch_s_mean": float(np.mean(timer.epoch_s)) if timer.epoch_s else 0.0,
+        }
+        if input_s is not None and compute_s is not None:
+            # a step takes max(input, compute) once prefetching overlaps the
+            # two; whatever it takes beyond pure compute is spent waiting
+            step = float(np.percentile(step_s, 50)) + summary["host_gap_ms_mean"] / 1000
+            input_wait = max(step - compute_s, 0.0)
+            summary.update({
+                "input_ms_per_batch": input_s * 1000,
+                "compute_ms_per_step": compute_s * 1000,
+                "input_wait_ms_per_step": input_wait * 1000,
+                "input_wait_fraction": input_wait / step if step else 0.0,
+                "input_bound": int(input_wait > 0.1 * step),
+            })
+        return summary
+
     def train(self):
-        self.steps_per_epoch = self.train_generator.samples // self.train_generator.batch_size
-        self.validation_steps = self.valid_generator.samples // self.valid_generator.batch_size
+        self.steps_per_epoch = self.train_samples // self.config.params_batch_size
+        self.validation_steps = self.valid_samples // self.config.params_batch_size
+
+        timer = StepTimer()
+        callbacks = [timer]
+        input_s = compute_s = None
+        if self.config.params_profile_training:
+            input_s = self.profile_input_pipeline()
+            compute_s = self.profile_compute()
+            logger.info(
+                f"input pipeline {input_s * 1000:.1f} ms/batch, "
+                f"compute {compute_s * 1000:.1f} ms/step"
+            )
+            first, last = self.config.params_profile_steps
+            last = min(last, self.steps_per_epoch)
+            first = min(first, last)
+            callbacks.append(tf.keras.callbacks.TensorBoard(
+                log_dir=str(self.config.profile_dir),
+                profile_batch=(first, last),
+                histogram_freq=0,
+                write_graph=False
+            ))
 
         self.model.fit(
             self.train_generator,
             epochs=self.config.params_epochs,
             steps_per_epoch=self.steps_per_epoch,
             validation_steps=self.validation_steps,
-            validation_data=self.valid_generator
+            validation_data=self.valid_generator,
+            callbacks=callbacks
         )
 
+        summary = self.profile_summary(timer, input_s, compute_s)
+        save_json(path=Path(self.config.profile_summary), data=summary)
+        logger.info(f"training throughput: {summary['images_per_s']:.1f} images/s")
+
+        # always ship a float32 model; serving doesn't depend on the training mode
+        model = self.model
+        if self.policy != "float32":
+            model = self.with_dtype_policy(model, "float32")
+            # keep the compile config in the .h5 so evaluation can call evaluate()
+            model.compile(
+                optimizer=tf.keras.optimizers.SGD(learning_rate=0.01),
+                loss=tf.keras.losses.CategoricalCrossentropy(),
+                metrics=["accuracy"]
+            )
+
         self.save_model(
             path=self.config.trained_model_path,
-            model=self.model
+            model=model
         )
@@ -4,6 +4,7 @@ from zipfile import ZipFile
 import tensorflow as tf
 from pathlib import Path
 from KidneyClassification.entity.config_entity import PrepareBaseModelConfig
+from KidneyClassification.utils.common import model_rescales_input
 
 class PrepareBaseModel:
     def __init__(self, config: PrepareBaseModelConfig):
@@ -32,15 +33,26 @@ class PrepareBaseModel:
             for layer in model.layers[:-freeze_till]:
                 layer.trainable = False
 
+        # Normalise in-graph: callers feed raw [0, 255] pixels (uint8 stores,
+        # serving buffers) and no float copy of the data is made outside the model.
+        # VGG16 is a plain chain, so its layers are re-applied after Rescaling.
+        if model_rescales_input(model):
+            inputs, features = model.input, model.output
+        else:
+            inputs = tf.keras.Input(shape=model.input_shape[1:], name="image")
+            features = tf.keras.layers.Rescaling(1. / 255, name="rescaling")(inputs)
+            for layer in model.layers[1:]:
+                features = layer(features)
+
         #  FIX 2: Add top layers
-        flatten_in = tf.keras.layers.Flatten()(model.output)
+        flatten_in = tf.keras.layers.Flatten()(features)
         prediction = tf.keras.layers.Dense(
             units=classes,
             activation="softmax"
         )(flatten_in)
 
         full_model = tf.keras.models.Model(
-            inputs=model.input,
+            inputs=inputs,
             outputs=prediction
         )
 
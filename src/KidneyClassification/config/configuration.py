@@ -1,10 +1,14 @@
 from KidneyClassification.constants import *
 from KidneyClassification.utils.common import read_yaml, create_directories,save_json
 from KidneyClassification.entity.config_entity import DataIngestionConfig
+from KidneyClassification.entity.config_entity import DataPreprocessingConfig
 from KidneyClassification.entity.config_entity import PrepareBaseModelConfig
 from KidneyClassification.entity.config_entity import TrainingConfig
 import os
 from KidneyClassification.entity.config_entity import EvaluationConfig
+from KidneyClassification.entity.config_entity import ModelExportConfig
+from KidneyClassification.entity.config_entity import PredictionConfig
+from KidneyClassification.entity.config_entity import AuthConfig
 
 
 class ConfigurationManager:
@@ -33,6 +37,22 @@ class ConfigurationManager:
         )
 
         return data_ingestion_config
+
+
+
+    def get_data_preprocessing_config(self) -> DataPreprocessingConfig:
+        config = self.config.data_preprocessing
+
+        create_directories([config.root_dir])
+
+        data_preprocessing_config = DataPreprocessingConfig(
+            root_dir=Path(config.root_dir),
+            source_dir=Path(config.source_dir),
+            chunk_size=config.chunk_size,
+            params_image_size=self.params.IMAGE_SIZE
+        )
+
+        return data_preprocessing_config
     
 
 
@@ -75,7 +95,17 @@ class ConfigurationManager:
             params_epochs=params.EPOCHS,
             params_batch_size=params.BATCH_SIZE,
             params_is_augmentation=params.AUGMENTATION,
-            params_image_size=params.IMAGE_SIZE
+            params_image_size=params.IMAGE_SIZE,
+            params_data_pipeline=params.DATA_PIPELINE,
+            params_data_cache=params.DATA_CACHE,
+            preprocessed_data=Path(self.config.data_preprocessing.root_dir),
+            params_training_mode=params.TRAINING_MODE,
+            params_intra_op_threads=params.INTRA_OP_THREADS,
+            params_inter_op_threads=params.INTER_OP_THREADS,
+            profile_dir=Path(training.profile_dir),
+            profile_summary=Path(training.profile_summary),
+            params_profile_training=params.PROFILE_TRAINING,
+            params_profile_steps=params.PROFILE_STEPS
         )
 
         return training_config
@@ -90,6 +120,74 @@ class ConfigurationManager:
             mlflow_uri="https://dagshub.com/gurnoor56/Kidney-disease-classification-with-mlflow-dvc.mlflow",
             all_params=self.params,
             params_image_size=self.params.IMAGE_SIZE,
-            params_batch_size=self.params.BATCH_SIZE
+            params_batch_size=self.params.BATCH_SIZE,
+            params_data_pipeline=self.params.DATA_PIPELINE,
+            params_data_cache=self.params.DATA_CACHE,
+            preprocessed_data=Path(self.config.data_preprocessing.root_dir),
+            training_profile=Path(self.config.training.profile_summary)
+        )
+        return eval_config
+
+
+
+    def get_model_export_config(self) -> ModelExportConfig:
+        config = self.config.model_export
+
+        create_directories([config.root_dir])
+
+        model_export_config = ModelExportConfig(
+            root_dir=Path(config.root_dir),
+            path_of_model=Path(self.config.training.trained_model_path),
+            preprocessed_data=Path(self.config.data_preprocessing.root_dir),
+            tflite_model_path=Path(config.tflite_model_path),
+            onnx_model_path=Path(config.onnx_model_path),
+            saved_model_path=Path(config.saved_model_path),
+            scores_path=Path(config.scores_path),
+            params_image_size=self.params.IMAGE_SIZE,
+            params_quantization=self.params.QUANTIZATION,
+            params_calibration_samples=self.params.CALIBRATION_SAMPLES,
+            params_export_onnx=self.params.EXPORT_ONNX
+        )
+
+        return model_export_config
+
+
+
+    def get_prediction_config(self) -> PredictionConfig:
+        config = self.config.prediction
+
+        prediction_config = PredictionConfig(
+            model_path=Path(config.model_path),
+            backend=config.backend,
+            model_server=config.model_server,
+            gradcam_model_path=Path(config.gradcam_model_path),
+            warmup=config.warmup,
+            max_batch_size=config.max_batch_size,
+            max_wait_ms=config.max_wait_ms,
+            cache_size=config.cache_size,
+            cache_dir=Path(config.cache_dir) if config.cache_dir else None,
+            results_size=config.results_size,
+            results_dir=Path(config.results_dir) if config.results_dir else None,
+            jobs_db=Path(config.jobs_db),
+            jobs_dir=Path(config.jobs_dir),
+            jobs_batch_size=config.jobs_batch_size,
+            jobs_workers=config.jobs_workers
         )
-        return eval_config
\ No newline at end of file
+
+        return prediction_config
+
+
+    def get_auth_config(self) -> AuthConfig:
+        config = self.config.auth
+
+        auth_config = AuthConfig(
+            hash_method=config.hash_method,
+            hash_workers=config.hash_workers,
+            hash_max_pending=config.hash_max_pending,
+            ip_attempts=config.ip_attempts,
+            ip_window_s=config.ip_window_s,
+            user_failures=config.user_failures,
+            user_window_s=config.user_window_s
+        )
+
+        return auth_config
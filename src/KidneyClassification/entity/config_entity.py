@@ -11,6 +11,15 @@ class DataIngestionConfig:
 
 
 
+@dataclass(frozen=True)
+class DataPreprocessingConfig:
+    root_dir: Path
+    source_dir: Path
+    chunk_size: int
+    params_image_size: list
+
+
+
 @dataclass(frozen=True)
 class PrepareBaseModelConfig:
     root_dir: Path
@@ -35,6 +44,16 @@ class TrainingConfig:
     params_batch_size: int
     params_is_augmentation: bool
     params_image_size: list
+    params_data_pipeline: str
+    params_data_cache: str
+    preprocessed_data: Path
+    params_training_mode: str
+    params_intra_op_threads: int
+    params_inter_op_threads: int
+    profile_dir: Path
+    profile_summary: Path
+    params_profile_training: bool
+    params_profile_steps: list
 
 
 
@@ -46,4 +65,57 @@ class EvaluationConfig:
     all_params:dict
     mlflow_uri:str
     params_image_size:list
-    params_batch_size:int
\ No newline at end of file
+    params_batch_size:int
+    params_data_pipeline:str
+    params_data_cache:str
+    preprocessed_data:Path
+    training_profile:Path
+
+
+
+@dataclass(frozen=True)
+class ModelExportConfig:
+    root_dir: Path
+    path_of_model: Path
+    preprocessed_data: Path
+    tflite_model_path: Path
+    onnx_model_path: Path
+    saved_model_path: Path
+    scores_path: Path
+    params_image_size: list
+    params_quantization: str
+    params_calibration_samples: int
+    params_export_onnx: bool
+
+
+
+
+@dataclass(frozen=True)
+class PredictionConfig:
+    model_path: Path
+    backend: str
+    model_server: str
+    gradcam_model_path: Path
+    warmup: bool
+    max_batch_size: int
+    max_wait_ms: float
+    cache_size: int
+    cache_dir: Path
+    results_size: int
+    results_dir: Path
+    jobs_db: Path
+    jobs_dir: Path
+    jobs_batch_size: int
+    jobs_workers: int
+
+
+
+@dataclass(frozen=True)
+class AuthConfig:
+    hash_method: str
+    hash_workers: int
+    hash_max_pending: int
+    ip_attempts: int
+    ip_window_s: float
+    user_failures: int
+    user_window_s: float
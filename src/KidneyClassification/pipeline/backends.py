@@ -0,0 +1,419 @@
+import os
+import secrets
+import stat
+import threading
+import time
+from collections import deque
+from functools import cached_property
+from multiprocessing.connection import Client
+from pathlib import Path
+
+import numpy as np
+from KidneyClassification import logger
+from KidneyClassification.utils.common import model_rescales_input
+from KidneyClassification.utils.metrics import STAGE_SECONDS
+
+
+class LatencyStats:
+    """
+    Per-call latency of a backend. The first call is kept apart from the
+    rolling window of recent calls so cold and steady-state costs can be
+    compared. With `stage` set, every call is also recorded in the
+    kidney_stage_seconds histogram served at /metrics.
+    """
+
+    def __init__(self, window: int = 1000, stage: str = None):
+        self.stage = stage
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.images = 0
+        self.first_call_ms = None
+
+    def record(self, batch_size: int, seconds: float):
+        if self.stage is not None:
+            STAGE_SECONDS.observe(seconds, stage=self.stage)
+        ms = seconds * 1000
+        with self._lock:
+            self.calls += 1
+            self.images += batch_size
+            if self.first_call_ms is None:
+                self.first_call_ms = ms
+            else:
+                self._recent.append(ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            recent = np.array(self._recent, dtype=np.float64)
+            calls, images, first = self.calls, self.images, self.first_call_ms
+        steady = {}
+        if len(recent):
+            steady = {
+                "mean_ms": float(recent.mean()),
+                "p50_ms": float(np.percentile(recent, 50)),
+                "p95_ms": float(np.percentile(recent, 95)),
+            }
+        return {"calls": calls, "images": images, "first_call_ms": first, "steady_state": steady}
+
+
+class InferenceBackend:
+    """
+    One way of running the classifier. Every backend follows the same
+    preprocessing contract:
+
+        predict(batch) takes (N, H, W, 3) raw [0, 255] RGB pixels (uint8 or
+        float) already resized to input_shape and returns (N, classes)
+        float32 probabilities.
+
+    Any scaling the model needs happens inside the backend, so callers
+    (PredictionPipeline, the MicroBatcher, batch scoring) never need to know
+    which runtime is loaded. Runtimes are imported lazily, so the ONNX and
+    TFLite backends run without TensorFlow when tflite_runtime /
+    onnxruntime are installed.
+    """
+    name = None
+    # Keras model usable for Grad-CAM, None for runtimes without gradients
+    keras_model = None
+    # True when the model (and Grad-CAM) run in another process
+    remote = False
+    warmed_up = False
+
+    def __init__(self, model_path):
+        self.model_path = Path(model_path)
+        self.input_shape = None
+        self.output_shape = None
+        self.latency = LatencyStats(stage="model_forward")
+
+    @cached_property
+    def model_version(self) -> str:
+        """identifies the loaded weights: backend, file name, size and mtime"""
+        path = self.model_path
+        if path.is_dir():
+            path = path / "saved_model.pb"
+        stat = path.stat()
+        return f"{self.name}:{self.model_path.name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def predict(self, batch) -> np.ndarray:
+        start = time.perf_counter()
+        out = self._predict(batch)
+        self.latency.record(len(out), time.perf_counter() - start)
+        return out
+
+    def _predict(self, batch) -> np.ndarray:
+        raise NotImplementedError
+
+    def warmup(self, batch_sizes=(1,)):
+        """
+        Run dummy batches so graph tracing, kernel selection and buffer
+        allocation happen before the first real request. Warm-up calls are
+        logged but kept out of self.latency.
+        """
+        for n in batch_sizes:
+            start = time.perf_counter()
+            self._predict(np.zeros((n,) + tuple(self.input_shape[1:]), dtype=np.uint8))
+            logger.info(
+                f"{self.name} backend warm-up, batch size {n}: "
+                f"{(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+        self.warmed_up = True
+
+
+class KerasBackend(InferenceBackend):
+    """
+    .h5 / .keras model through tf.keras, also used for Grad-CAM.
+
+    Serves through a tf.function traced once at load for (None, H, W, 3)
+    uint8 and float32 inputs instead of Keras' predict() loop, which builds
+    a data adapter and step function on every call.
+    """
+    name = "keras"
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        import tensorflow as tf
+
+        self._tf = tf
+        self.keras_model = tf.keras.models.load_model(self.model_path)
+        self.rescales_input = model_rescales_input(self.keras_model)
+        self.input_shape = self.keras_model.input_shape
+        self.output_shape = self.keras_model.output_shape
+
+        model, rescales_input = self.keras_model, self.rescales_input
+
+        @tf.function
+        def serve(x):
+            x = tf.cast(x, tf.float32)
+            if not rescales_input:
+                x = x / 255.0
+            return tf.cast(model(x, training=False), tf.float32)
+
+        shape = (None,) + tuple(self.input_shape[1:])
+        self._serving_fns = {
+            dtype: serve.get_concrete_function(tf.TensorSpec(shape, dtype, name="image"))
+            for dtype in (tf.uint8, tf.float32)
+        }
+
+    def _predict(self, batch) -> np.ndarray:
+        batch = self._tf.convert_to_tensor(batch)
+        fn = self._serving_fns.get(batch.dtype)
+        if fn is None:
+            batch = self._tf.cast(batch, self._tf.float32)
+            fn = self._serving_fns[self._tf.float32]
+        return fn(batch).numpy()
+
+
+class SavedModelBackend(InferenceBackend):
+    """
+    SavedModel directory served through its serving_default concrete
+    function, i.e. without rebuilding the Keras layer objects. Expects the
+    raw [0, 255] input contract of components/model_export.py.
+    """
+    name = "saved_model"
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        import tensorflow as tf
+
+        self._tf = tf
+        self._loaded = tf.saved_model.load(str(self.model_path))
+        self._fn = self._loaded.signatures["serving_default"]
+
+        spec = self._fn.structured_input_signature[1]
+        self._input_name = next(iter(spec))
+        self._output_name = next(iter(self._fn.structured_outputs))
+        self.input_shape = tuple(spec[self._input_name].shape)
+        self.output_shape = tuple(self._fn.structured_outputs[self._output_name].shape)
+
+    def _predict(self, batch) -> np.ndarray:
+        batch = self._tf.cast(batch, self._tf.float32)
+        return self._fn(**{self._input_name: batch})[self._output_name].numpy()
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    tflite_runtime (or tf.lite) interpreter. Exported models take raw
+    [0, 255] float32 pixels, see components/model_export.py.
+
+    Resizing an interpreter's input reallocates all of its tensors, so
+    instead of resizing one interpreter back and forth there is one
+    interpreter per batch size, allocated once (warm-up allocates 1 and
+    max_batch_size). A batch runs on the smallest one that fits it,
+    zero-padded up to that size; a batch larger than any of them gets an
+    interpreter of its own.
+    """
+    name = "tflite"
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self._Interpreter = Interpreter
+        # batch size -> (interpreter, input details, output details, lock)
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+        interpreter = Interpreter(model_path=str(self.model_path))
+        interpreter.allocate_tensors()
+        inp = interpreter.get_input_details()[0]
+        out = interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(inp["shape"][1:])
+        self.output_shape = (None,) + tuple(out["shape"][1:])
+        self._slots[int(inp["shape"][0])] = (interpreter, inp, out, threading.Lock())
+
+    def _slot(self, n):
+        """the interpreter for a batch of n: the smallest allocated size >= n"""
+        with self._slots_lock:
+            fitting = [size for size in self._slots if size >= n]
+            if fitting:
+                size = min(fitting)
+                return size, self._slots[size]
+            interpreter = self._Interpreter(model_path=str(self.model_path))
+            index = interpreter.get_input_details()[0]["index"]
+            interpreter.resize_tensor_input(index, (n,) + tuple(self.input_shape[1:]))
+            interpreter.allocate_tensors()
+            logger.info(f"tflite backend: allocated an interpreter for batch size {n}")
+            slot = (interpreter, interpreter.get_input_details()[0],
+                    interpreter.get_output_details()[0], threading.Lock())
+            self._slots[n] = slot
+            return n, slot
+
+    def _predict(self, batch) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        n = len(batch)
+        size, (interpreter, inp, out, lock) = self._slot(n)
+        if size != n:
+            padded = np.zeros((size,) + batch.shape[1:], dtype=np.float32)
+            padded[:n] = batch
+            batch = padded
+        # one interpreter, one set of tensors: calls on it must not overlap
+        with lock:
+            interpreter.set_tensor(inp["index"], batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(out["index"])[:n].copy()
+
+
+class ONNXBackend(InferenceBackend):
+    """ONNX Runtime session, same raw [0, 255] float32 input as TFLite"""
+    name = "onnx"
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(str(self.model_path), providers=["CPUExecutionProvider"])
+        inp, out = self.session.get_inputs()[0], self.session.get_outputs()[0]
+        self._input_name = inp.name
+        self.input_shape = (None,) + tuple(inp.shape[1:])
+        self.output_shape = (None,) + tuple(out.shape[1:])
+
+    def _predict(self, batch) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+# shared secret of the model server link; overrides the generated key file
+AUTHKEY_ENV = "KIDNEY_MODEL_SERVER_KEY"
+
+
+def private_runtime_dir(address, create=False) -> Path:
+    """
+    Directory holding the model server socket and key. It must belong to
+    this user and be closed to everyone else (0700), so no other local
+    user can pre-create the socket or read the key.
+    """
+    directory = Path(address).parent
+    if create:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = directory.stat()
+    if st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) & 0o077:
+        raise PermissionError(
+            f"{directory} must be owned by the current user with mode 0700 "
+            f"(is {stat.S_IMODE(st.st_mode):o}, uid {st.st_uid})"
+        )
+    return directory
+
+
+def model_server_authkey(address, create=False) -> bytes:
+    """
+    The `authkey` both ends of the model server link use: ${AUTHKEY_ENV} if
+    set, otherwise the `authkey` file next to the socket, which the server
+    generates (mode 0600) on first start.
+    """
+    key = os.environ.get(AUTHKEY_ENV)
+    if key:
+        return key.encode()
+
+    path = Path(address).parent / "authkey"
+    try:
+        private_runtime_dir(address, create=create)
+        if create and not path.exists():
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, "w") as f:
+                    f.write(secrets.token_hex(32))
+        return path.read_bytes().strip()
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"no model server key: set {AUTHKEY_ENV} or start the model server first ({path})"
+        ) from None
+
+
+class RemoteBackend(InferenceBackend):
+    """
+    Client of a local model server (pipeline/model_server.py) over a Unix
+    socket. The model, its micro-batcher and Grad-CAM live in the server
+    process, so any number of web workers share one copy of the model.
+    Each thread keeps its own connection; connections authenticate with
+    the shared `authkey` before any pickled message is exchanged.
+    """
+    name = "remote"
+    remote = True
+
+    def __init__(self, address, authkey: bytes):
+        super().__init__(address)
+        self.address = str(address)
+        self._authkey = authkey
+        self._local = threading.local()
+
+        info = self._call("info")
+        self.input_shape = tuple(info["input_shape"])
+        self.output_shape = tuple(info["output_shape"])
+        self.server_backend = info["backend"]
+        self.model_version = info["model_version"]
+        logger.info(f"connected to {self.server_backend} model server at {self.address}")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self._authkey)
+        return conn
+
+    def _call(self, op, *args):
+        for attempt in (1, 2):
+            try:
+                conn = self._connection()
+                conn.send((op,) + args)
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError):
+                # server restarted or connection dropped: reconnect once
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+        if status == "error":
+            raise RuntimeError(f"model server: {payload}")
+        return payload
+
+    def _predict(self, batch) -> np.ndarray:
+        return self._call("predict", np.asarray(batch))
+
+    def gradcam(self, x, class_idx, layer_name="block5_conv3"):
+        """(probabilities, Grad-CAM maps), computed by the server"""
+        return self._call("gradcam", np.asarray(x), np.asarray(class_idx), layer_name)
+
+    def server_stats(self) -> dict:
+        return self._call("stats")
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (KerasBackend, SavedModelBackend, TFLiteBackend, ONNXBackend, RemoteBackend)
+}
+
+
+def resolve_backend_name(model_path, backend="auto") -> str:
+    """'auto' picks the backend from the model path: .tflite, .onnx, a
+    SavedModel directory, otherwise Keras. 'remote' is never picked
+    automatically."""
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"unknown inference backend {backend!r}, expected auto or one of {sorted(BACKENDS)}"
+            )
+        return backend
+
+    path = Path(model_path)
+    suffix = path.suffix.lower()
+    if suffix == ".tflite":
+        return "tflite"
+    if suffix == ".onnx":
+        return "onnx"
+    if path.is_dir() and (path / "saved_model.pb").exists():
+        return "saved_model"
+    return "keras"
+
+
+def load_backend(model_path, backend="auto", server_address=None) -> InferenceBackend:
+    name = resolve_backend_name(model_path, backend)
+    if name == "remote":
+        if not server_address:
+            raise ValueError("the remote backend needs a model server address")
+        return RemoteBackend(server_address, model_server_authkey(server_address))
+    logger.info(f"loading {name} inference backend from: {model_path}")
+    return BACKENDS[name](model_path)
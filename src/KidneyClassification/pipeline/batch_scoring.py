@@ -0,0 +1,243 @@
+import argparse
+import csv
+import json
+import os
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from KidneyClassification import logger
+from KidneyClassification.config.configuration import ConfigurationManager
+from KidneyClassification.components.data_preprocessing import INDEX_FILE, PreprocessedDataPipeline
+from KidneyClassification.pipeline.backends import BACKENDS
+from KidneyClassification.pipeline.prediction import PredictionPipeline
+
+
+STAGE_NAME = "Batch Scoring"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif"}
+CSV_FIELDS = ["path", "prediction", "confidence", "prob_normal", "prob_tumor"]
+# how both input modes resize: the data_preprocessing store is written with
+# ImageDataPipeline._decode (bilinear, rounded), so files are read the same way
+RESIZE_METHOD = "bilinear"
+
+
+class BatchScoringPipeline:
+    """
+    Score a directory tree or a file list offline.
+
+    Images are decoded and resized in parallel by tf.data, the model runs on
+    large batches, and one result per image is appended to a JSONL or CSV
+    file as each batch finishes, so memory use does not grow with the number
+    of inputs. Re-running with the same output file skips inputs that are
+    already scored.
+
+    A scan scores the same whether it comes from a data_preprocessing store
+    or as a file: both are resized bilinearly, as the model was trained.
+    Scores can differ slightly from /predict, whose decode_image resizes
+    with nearest neighbour.
+    """
+
+    def __init__(self, output_path, batch_size=64, model_path=None, image_size=None,
+                 backend=None):
+        self.output_path = Path(output_path)
+        self.batch_size = batch_size
+        self.format = "csv" if self.output_path.suffix.lower() == ".csv" else "jsonl"
+
+        config = ConfigurationManager()
+        # batching here is explicit and inputs are unique, so no MicroBatcher or result cache
+        prediction_config = replace(config.get_prediction_config(), max_batch_size=1, cache_size=0)
+        if model_path is not None:
+            prediction_config = replace(prediction_config, model_path=Path(model_path))
+        if backend is not None:
+            prediction_config = replace(prediction_config, backend=backend)
+        self.image_size = tuple(image_size or config.params.IMAGE_SIZE[:-1])
+
+        self.classifier = PredictionPipeline(None, config=prediction_config)
+        self.preprocessed = None
+
+    def collect_inputs(self, source) -> list:
+        """
+        data_preprocessing output -> every stored image (no JPEG decode);
+        directory -> every image under it; text file -> one path per line
+        """
+        source = Path(source)
+        if (source / INDEX_FILE).exists():
+            self.preprocessed = PreprocessedDataPipeline(
+                source, self.image_size, self.batch_size, validation_split=0.0
+            )
+            # stores written before the method was recorded are bilinear
+            resize = self.preprocessed.index.get("resize", "bilinear")
+            if resize != RESIZE_METHOD:
+                raise ValueError(
+                    f"preprocessed data in {source} was resized with {resize}, "
+                    f"batch scoring resizes with {RESIZE_METHOD}"
+                )
+            return self.preprocessed.list_files("training")[0]
+        if source.is_dir():
+            return sorted(
+                str(p) for p in source.rglob("*")
+                if p.suffix.lower() in IMAGE_EXTENSIONS
+            )
+        with open(source) as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _drop_partial_row(self):
+        """
+        Truncate the output back to its last newline-terminated row. An
+        interrupted run can leave half a row behind, and the next append
+        would otherwise be glued onto it.
+        """
+        if not self.output_path.exists():
+            return
+        with open(self.output_path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(pos, 65536)
+                f.seek(pos - step)
+                newline = f.read(step).rfind(b"\n")
+                if newline != -1:
+                    pos = pos - step + newline + 1
+                    break
+                pos -= step
+            if pos != end:
+                logger.warning(f"dropping a partial last row of {self.output_path} ({end - pos} bytes)")
+                f.truncate(pos)
+
+    def _already_scored(self) -> set:
+        if not self.output_path.exists():
+            return set()
+
+        with open(self.output_path, newline="") as f:
+            if self.format == "csv":
+                return {row["path"] for row in csv.DictReader(f)}
+            done = set()
+            for line in f:
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    # a corrupt line (a partial last row is already truncated away)
+                    continue
+            return done
+
+    def _preprocessed_dataset(self, paths) -> tf.data.Dataset:
+        data = self.preprocessed
+        wanted = set(paths)
+        records = data.index["records"]
+        rows = np.array([i for i, r in enumerate(records) if r["path"] in wanted], dtype=np.int64)
+        h, w = self.image_size
+
+        def load_batch(batch_rows):
+            return data.gather(batch_rows.numpy())
+
+        def to_batch(batch_rows):
+            images = tf.py_function(load_batch, [batch_rows], tf.uint8)
+            images.set_shape((None, h, w, 3))
+            return tf.gather(all_paths, batch_rows), images
+
+        all_paths = tf.constant([r["path"] for r in records])
+        return (
+            tf.data.Dataset.from_tensor_slices(rows)
+            .batch(self.batch_size)
+            .map(to_batch, num_parallel_calls=tf.data.AUTOTUNE)
+            .prefetch(tf.data.AUTOTUNE)
+        )
+
+    def _dataset(self, paths) -> tf.data.Dataset:
+        if self.preprocessed is not None:
+            return self._preprocessed_dataset(paths)
+
+        image_size = self.image_size
+
+        def load(path):
+            data = tf.io.read_file(path)
+            img = tf.io.decode_image(data, channels=3, expand_animations=False)
+            # same pixels as a data_preprocessing store (ImageDataPipeline._decode)
+            img = tf.image.resize(img, image_size, method=RESIZE_METHOD)
+            # raw [0, 255] pixels; predict_batch applies the model's scaling
+            return path, tf.cast(tf.round(img), tf.uint8)
+
+        return (
+            tf.data.Dataset.from_tensor_slices(paths)
+            .map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+            # unreadable files are dropped; the path travels with each image
+            .ignore_errors(log_warning=True)
+            .batch(self.batch_size)
+            .prefetch(tf.data.AUTOTUNE)
+        )
+
+    def _rows(self, paths, probs):
+        for path, p in zip(paths, probs):
+            cls = int(np.argmax(p))
+            yield {
+                "path": path.decode() if isinstance(path, bytes) else path,
+                "prediction": "Tumor" if cls == 1 else "Normal",
+                "confidence": round(float(p[cls]) * 100, 2),
+                "prob_normal": float(p[0]),
+                "prob_tumor": float(p[1]),
+            }
+
+    def run(self, inputs) -> int:
+        self._drop_partial_row()
+        done = self._already_scored()
+        todo = [p for p in inputs if p not in done]
+        logger.info(
+            f"{len(inputs)} inputs, {len(done)} already scored, {len(todo)} to score"
+        )
+        if not todo:
+            return 0
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not self.output_path.exists() or os.path.getsize(self.output_path) == 0
+        scored = 0
+
+        with open(self.output_path, "a", newline="") as f:
+            writer = None
+            if self.format == "csv":
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                if new_file:
+                    writer.writeheader()
+
+            for paths, images in self._dataset(todo):
+                probs = self.classifier.predict_batch(images)
+                for row in self._rows(paths.numpy(), probs):
+                    if writer is not None:
+                        writer.writerow(row)
+                    else:
+                        f.write(json.dumps(row) + "\n")
+                    scored += 1
+                f.flush()
+                logger.info(f"scored {scored}/{len(todo)}")
+
+        return scored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline bulk scoring of kidney CT scans")
+    parser.add_argument("source", help="image directory, data_preprocessing output directory, or a text file with one image path per line")
+    parser.add_argument("output", help="results file (.jsonl or .csv); existing rows are skipped on re-run")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model-path", default=None, help="defaults to prediction.model_path in config.yaml")
+    parser.add_argument("--backend", default=None, choices=["auto", *BACKENDS],
+                        help="defaults to prediction.backend in config.yaml")
+    args = parser.parse_args(argv)
+
+    pipeline = BatchScoringPipeline(
+        args.output, batch_size=args.batch_size, model_path=args.model_path,
+        backend=args.backend
+    )
+    inputs = pipeline.collect_inputs(args.source)
+    scored = pipeline.run(inputs)
+    logger.info(f"{scored} new results written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
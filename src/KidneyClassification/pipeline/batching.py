@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+from KidneyClassification import logger
+
+
+class MicroBatcher:
+    """
+    Fuses concurrent single-image requests into one forward pass.
+
+    Callers submit one preprocessed image (H x W x C) and get a Future back.
+    A worker thread waits for the first request, keeps collecting until
+    `max_batch_size` images are queued or `max_wait_ms` has passed, runs
+    `predict_fn` once on the stacked batch and hands row i back to caller i.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name="MicroBatcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, x: np.ndarray) -> Future:
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+
+        future = Future()
+        self._queue.put((x, future))
+        return future
+
+    def predict(self, x: np.ndarray, timeout: float = None) -> np.ndarray:
+        """Blocking helper: submit one image and wait for its output row."""
+        return self.submit(x).result(timeout=timeout)
+
+    def pending(self) -> int:
+        """requests waiting for the next batch"""
+        return self._queue.qsize()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # re-queue the sentinel so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # drop requests whose caller already gave up
+            live = [(x, f) for x, f in batch if f.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            inputs, futures = zip(*live)
+
+            try:
+                outputs = self.predict_fn(np.stack(inputs, axis=0))
+            except Exception as e:
+                logger.exception(e)
+                for f in futures:
+                    f.set_exception(e)
+                continue
+
+            for f, out in zip(futures, outputs):
+                f.set_result(out)
@@ -0,0 +1,277 @@
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from KidneyClassification import logger
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    total    INTEGER NOT NULL,
+    created  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id     TEXT NOT NULL,
+    idx        INTEGER NOT NULL,
+    status     TEXT NOT NULL DEFAULT 'queued',  -- queued | running | done | failed
+    claimed_at REAL,
+    result     TEXT,
+    error      TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, claimed_at);
+"""
+
+# progress of one job, aggregated over its items
+PROGRESS_SQL = """
+SELECT j.id, j.username, j.total, j.created,
+       SUM(i.status = 'done') AS done,
+       SUM(i.status = 'failed') AS failed
+FROM jobs j JOIN items i ON i.job_id = j.id
+WHERE j.id = ?
+GROUP BY j.id
+"""
+
+
+class JobQueue:
+    """
+    Persistent prediction jobs in SQLite.
+
+    submit() stores the encoded images under `image_dir/<job id>/` and one
+    row per image, then returns at once. Worker threads claim up to
+    `batch_size` queued images at a time (BEGIN IMMEDIATE, so several web
+    processes can share the database), run them through
+    `predict_many` and store one JSON result per image. Images claimed
+    longer than `stale_after_s` ago (a worker died mid-batch) are queued
+    again. An image's file is deleted once it has a result.
+    """
+
+    def __init__(self, db_path, image_dir, predict_many, batch_size=32,
+                 workers=1, stale_after_s=600):
+        self.db_path = Path(db_path)
+        self.image_dir = Path(image_dir)
+        self.predict_many = predict_many
+        self.batch_size = int(batch_size)
+        self.workers = int(workers)
+        self.stale_after_s = stale_after_s
+        self._wake = threading.Event()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _db(self):
+        # one short-lived connection per use: sqlite3 connections are not
+        # shared between threads
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # ---- API ----
+    def submit(self, username: str, images) -> str:
+        """queue encoded images (bytes) as a new job"""
+        job_id, job_dir = self.reserve()
+        try:
+            for idx, data in enumerate(images):
+                (job_dir / self.image_name(idx)).write_bytes(data)
+        except BaseException:
+            self.discard(job_id)
+            raise
+        return self.commit(username, job_id, len(images))
+
+    def reserve(self):
+        """
+        (job id, empty image directory) for a new job. Write its images
+        there as image_name(0), image_name(1), ... and then commit() it,
+        or discard() it on failure. Nothing is queued before commit().
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self.image_dir / job_id
+        job_dir.mkdir(parents=True)
+        return job_id, job_dir
+
+    @staticmethod
+    def image_name(idx: int) -> str:
+        return f"{idx:06d}"
+
+    def discard(self, job_id: str):
+        shutil.rmtree(self.image_dir / job_id, ignore_errors=True)
+
+    def commit(self, username: str, job_id: str, count: int) -> str:
+        with self._db() as db:
+            db.execute("BEGIN")
+            db.execute(
+                "INSERT INTO jobs (id, username, total, created) VALUES (?, ?, ?, ?)",
+                (job_id, username, count, time.time())
+            )
+            db.executemany(
+                "INSERT INTO items (job_id, idx) VALUES (?, ?)",
+                [(job_id, idx) for idx in range(count)]
+            )
+            db.execute("COMMIT")
+
+        self._wake.set()
+        logger.info(f"job {job_id}: {count} images queued")
+        return job_id
+
+    def status(self, job_id: str):
+        """progress of the job, or None if it doesn't exist"""
+        with self._db() as db:
+            row = db.execute(PROGRESS_SQL, (job_id,)).fetchone()
+        if row is None:
+            return None
+        job_id, username, total, created, done, failed = row
+        finished = done + failed
+        return {
+            "id": job_id,
+            "username": username,
+            "status": "finished" if finished == total else ("queued" if finished == 0 else "running"),
+            "total": total,
+            "done": done,
+            "failed": failed,
+            "created": created,
+        }
+
+    def results(self, job_id: str) -> list:
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT idx, status, result, error FROM items WHERE job_id = ? ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        return [
+            {
+                "index": idx,
+                "status": status,
+                "result": json.loads(result) if result else None,
+                "error": error,
+            }
+            for idx, status, result, error in rows
+        ]
+
+    def pending(self) -> dict:
+        """number of items per status (queued / running) across all jobs"""
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM items WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def prune(self, max_age_s: float) -> int:
+        """
+        delete jobs (rows and any leftover images) older than max_age_s,
+        and image directories of uploads that were never committed
+        """
+        cutoff = time.time() - max_age_s
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            old = [r[0] for r in db.execute("SELECT id FROM jobs WHERE created < ?", (cutoff,))]
+            db.executemany("DELETE FROM items WHERE job_id = ?", [(j,) for j in old])
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(j,) for j in old])
+            db.execute("COMMIT")
+        for job_id in old:
+            self.discard(job_id)
+
+        with self._db() as db:
+            known = {r[0] for r in db.execute("SELECT id FROM jobs")}
+        for job_dir in self.image_dir.iterdir():
+            try:
+                abandoned = job_dir.name not in known and job_dir.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                continue
+            if abandoned:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        return len(old)
+
+    # ---- workers ----
+    def start(self):
+        for n in range(self.workers):
+            threading.Thread(target=self._work, name=f"JobWorker-{n}", daemon=True).start()
+
+    def _claim(self) -> list:
+        now = time.time()
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                """SELECT job_id, idx FROM items
+                   WHERE status = 'queued' OR (status = 'running' AND claimed_at < ?)
+                   ORDER BY rowid LIMIT ?""",
+                (now - self.stale_after_s, self.batch_size)
+            ).fetchall()
+            db.executemany(
+                "UPDATE items SET status = 'running', claimed_at = ? WHERE job_id = ? AND idx = ?",
+                [(now, job_id, idx) for job_id, idx in rows]
+            )
+            db.execute("COMMIT")
+        return rows
+
+    def _work(self):
+        while True:
+            try:
+                items = self._claim()
+            except sqlite3.Error as e:
+                logger.exception(e)
+                items = []
+            if not items:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            try:
+                self._run(items)
+            except Exception as e:
+                # items stay 'running' and are reclaimed once stale
+                logger.exception(e)
+
+    def _run(self, items):
+        paths = [self.image_dir / job_id / self.image_name(idx) for job_id, idx in items]
+        outcomes = {}
+        try:
+            images = [p.read_bytes() for p in paths]
+            results = self.predict_many(images)
+            outcomes = {item: (r, None) for item, r in zip(items, results)}
+        except Exception:
+            # find the bad image(s): retry one at a time
+            for item, path in zip(items, paths):
+                try:
+                    outcomes[item] = (self.predict_many([path.read_bytes()])[0], None)
+                except Exception as e:
+                    outcomes[item] = (None, f"{type(e).__name__}: {e}")
+
+        with self._db() as db:
+            db.execute("BEGIN")
+            for (job_id, idx), (result, error) in outcomes.items():
+                if error is None:
+                    db.execute(
+                        "UPDATE items SET status = 'done', result = ? WHERE job_id = ? AND idx = ?",
+                        (json.dumps(self._public(result)), job_id, idx)
+                    )
+                else:
+                    db.execute(
+                        "UPDATE items SET status = 'failed', error = ? WHERE job_id = ? AND idx = ?",
+                        (error, job_id, idx)
+                    )
+            db.execute("COMMIT")
+
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _public(result: dict) -> dict:
+        return {
+            "prediction": result["prediction"],
+            "confidence": result["confidence"],
+            "gradcam_path": result["gradcam_path"],
+            "original_image_path": result["original_image_path"],
+            "cached": result["cached"],
+        }
@@ -0,0 +1,129 @@
+import argparse
+import os
+import threading
+from dataclasses import replace
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+from pathlib import Path
+
+import numpy as np
+from KidneyClassification import logger
+from KidneyClassification.config.configuration import ConfigurationManager
+from KidneyClassification.entity.config_entity import PredictionConfig
+from KidneyClassification.pipeline.backends import model_server_authkey
+from KidneyClassification.pipeline.prediction import PredictionPipeline
+
+
+STAGE_NAME = "Model Server"
+
+
+class ModelServer:
+    """
+    Hosts one PredictionPipeline for every web worker on the machine.
+
+    Workers configured with `backend: remote` connect to the Unix socket at
+    `address` (RemoteBackend) and send (op, *args) tuples:
+
+        ("info",)                              -> shapes, backend, model version
+        ("predict", batch)                     -> (N, classes) probabilities
+        ("gradcam", x, class_idx, layer_name)  -> (probabilities, cams)
+        ("stats",)                             -> latency summary
+
+    and get ("ok", payload) or ("error", message) back. The socket lives in
+    a private (0700) directory and every connection must pass the
+    `multiprocessing` authkey handshake before anything is unpickled
+    (see model_server_authkey). Each connection is
+    served on its own thread; single-image predictions from all of them go
+    through the pipeline's MicroBatcher, so concurrent requests from
+    different workers share one forward pass.
+    """
+
+    def __init__(self, config: PredictionConfig, address: str):
+        self.address = str(address)
+        # creates the private directory (and the key file) before binding
+        self._authkey = model_server_authkey(self.address, create=True)
+        # the server owns the real model; the result cache stays with the workers
+        self.pipeline = PredictionPipeline(None, config=replace(config, cache_size=0))
+        if config.warmup:
+            self.pipeline.warmup_gradcam()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            # stale socket from a previous run
+            os.unlink(self.address)
+
+        with Listener(self.address, family="AF_UNIX", authkey=self._authkey) as listener:
+            os.chmod(self.address, 0o600)
+            logger.info(f"model server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    logger.warning(f"rejected model server connection: {e}")
+                    continue
+                threading.Thread(
+                    target=self._serve_connection, args=(conn,),
+                    name="ModelServerConnection", daemon=True
+                ).start()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(("ok", self._dispatch(op, args)))
+                except Exception as e:
+                    logger.exception(e)
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    def _dispatch(self, op, args):
+        pipeline = self.pipeline
+        if op == "predict":
+            (batch,) = args
+            if len(batch) == 1 and pipeline.batcher is not None:
+                return np.expand_dims(pipeline.batcher.predict(batch[0]), axis=0)
+            return pipeline.predict_batch(batch)
+        if op == "gradcam":
+            x, class_idx, layer_name = args
+            return pipeline.compute_cams(x, class_idx, layer_name)
+        if op == "info":
+            backend = pipeline.backend
+            return {
+                "backend": backend.name,
+                "input_shape": tuple(backend.input_shape),
+                "output_shape": tuple(backend.output_shape),
+                "model_version": backend.model_version,
+            }
+        if op == "stats":
+            return pipeline.latency_summary()
+        raise ValueError(f"unknown op {op!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the model to local web workers over a Unix socket")
+    parser.add_argument("--address", default=None, help="defaults to prediction.model_server in config.yaml")
+    parser.add_argument("--model-path", default=None, help="defaults to prediction.model_path in config.yaml")
+    parser.add_argument("--backend", default=None, help="backend used inside the server, defaults to prediction.backend (auto when that is remote)")
+    args = parser.parse_args(argv)
+
+    config = ConfigurationManager().get_prediction_config()
+    backend = args.backend or config.backend
+    if backend == "remote":
+        backend = "auto"
+    config = replace(config, backend=backend)
+    if args.model_path is not None:
+        config = replace(config, model_path=Path(args.model_path))
+
+    ModelServer(config, args.address or config.model_server).serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        main()
+    except Exception as e:
+        logger.exception(e)
+        raise e
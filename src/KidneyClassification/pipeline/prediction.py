@@ -1,116 +1,453 @@
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import tensorflow as tf
-import cv2
 import os
-import shutil
+import itertools
+import queue
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import time
+from KidneyClassification.entity.config_entity import PredictionConfig
+from KidneyClassification.pipeline.backends import InferenceBackend, LatencyStats, load_backend
+from KidneyClassification.pipeline.batching import MicroBatcher
+from KidneyClassification.pipeline.result_cache import PredictionCache
+from KidneyClassification.utils.common import model_rescales_input
+from KidneyClassification.utils.gradcam import HeatmapRenderer, compute_cam
+from KidneyClassification.utils.image_utils import DecodedImage, decode_image, save_rgb_image
+from KidneyClassification.utils.metrics import PREDICTIONS, timed
+
+
+# content-addressed per-prediction artifacts (served from /static)
+UPLOADS_DIR = os.path.join("static", "uploads")
+GRADCAM_DIR = os.path.join("static", "gradcam")
 
 
 class PredictionPipeline:
-    def __init__(self, filename):
+    # compiled Grad-CAM steps keyed by (id(model), layer_name)
+    _gradcam_steps = {}
+    _gradcam_lock = threading.Lock()
+    # idle HeatmapRenderers shared by all request threads (werkzeug's
+    # threaded server starts a new thread per request)
+    _renderers = queue.LifoQueue(maxsize=4)
+    # per-call cost of the Grad-CAM step (forward + backward pass)
+    gradcam_latency = LatencyStats(stage="gradcam")
+
+    def __init__(self, filename, config: PredictionConfig = None):
         self.filename = filename
         self.last_prediction = None
+        self.config = config
+        self.batcher = None
 
         # ---------------------------
         # 🔥 Load model only once
         # ---------------------------
-        model_path = "model/model.h5"
-        if not hasattr(PredictionPipeline, "model"):
-            PredictionPipeline.model = load_model(model_path)
+        model_path = config.model_path if config else "model/model.h5"
+        backend = config.backend if config else "auto"
+        if not hasattr(PredictionPipeline, "backend"):
+            PredictionPipeline.backend = load_backend(
+                model_path, backend, server_address=config.model_server if config else None
+            )
+
+        self.backend: InferenceBackend = PredictionPipeline.backend
+
+        # a model server fuses requests from every web worker itself
+        if config and config.max_batch_size > 1 and not self.backend.remote:
+            self.enable_batching(config.max_batch_size, config.max_wait_ms)
+
+        self.cache = None
+        if config and config.cache_size > 0:
+            self.enable_cache(config.cache_size, config.cache_dir)
+
+        if config and config.warmup and not self.backend.warmed_up:
+            sizes = [1] if self.batcher is None else sorted({1, config.max_batch_size})
+            self.backend.warmup(sizes)
+
+
+    # ------------------------------------------------------------
+    # ⚡ Forward pass (optionally micro-batched)
+    # ------------------------------------------------------------
+    def enable_batching(self, max_batch_size=16, max_wait_ms=10.0):
+        """
+        Route single-image forward passes through a shared MicroBatcher so
+        concurrent requests are fused into one model call.
+        """
+        if not hasattr(PredictionPipeline, "batcher_instance"):
+            PredictionPipeline.batcher_instance = MicroBatcher(
+                self.predict_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms
+            )
+        self.batcher = PredictionPipeline.batcher_instance
+
+    # ------------------------------------------------------------
+    # ♻️ Result cache
+    # ------------------------------------------------------------
+    def enable_cache(self, max_entries=256, disk_dir=None):
+        """
+        Reuse results for resubmitted scans (same decoded pixels, same
+        model). Shared by every pipeline instance, like the batcher.
+        """
+        if not hasattr(PredictionPipeline, "cache_instance"):
+            PredictionPipeline.cache_instance = PredictionCache(max_entries, disk_dir)
+        self.cache = PredictionPipeline.cache_instance
+
+    def latency_summary(self) -> dict:
+        """first-call and steady-state latency of the model and Grad-CAM calls"""
+        return {
+            "backend": self.backend.name,
+            "model": self.backend.latency.summary(),
+            "gradcam": PredictionPipeline.gradcam_latency.summary(),
+            # as seen inside the model server, without the socket round trip
+            "server": self.backend.server_stats() if self.backend.remote else None,
+        }
 
-        self.model = PredictionPipeline.model
+    def predict_batch(self, batch):
+        """
+        Run the model once on an (N, 224, 224, 3) batch of raw [0, 255] pixels
+        (uint8 or float), return (N, classes). Any scaling the model needs is
+        applied by the backend.
+        """
+        return self.backend.predict(batch)
+
+    def _forward(self, x):
+        """x: a single resized uint8 image (224, 224, 3) -> class probabilities."""
+        if self.batcher is not None:
+            return self.batcher.predict(x)
+        return self.predict_batch(np.expand_dims(x, axis=0))[0]
 
 
     # ------------------------------------------------------------
     # 🔥 PERFECT Grad-CAM
     # ------------------------------------------------------------
-    def generate_gradcam(self, layer_name="block5_conv3"):
-        model = self.model
+    def _gradcam_model(self):
+        """
+        Grad-CAM needs gradients, so non-Keras backends fall back to the
+        Keras model at gradcam_model_path (loaded on first use).
+        """
+        if self.backend.keras_model is not None:
+            return self.backend.keras_model
+        if not hasattr(PredictionPipeline, "gradcam_model"):
+            import tensorflow as tf
 
-        # Load full image
-        orig = cv2.imread(self.filename)
-        orig = cv2.cvtColor(orig, cv2.COLOR_BGR2RGB)
-        oh, ow = orig.shape[:2]
+            path = self.config.gradcam_model_path if self.config else "model/model.h5"
+            PredictionPipeline.gradcam_model = tf.keras.models.load_model(path)
+        return PredictionPipeline.gradcam_model
 
-        # Resize for model
-        resized = cv2.resize(orig, (224, 224))
-        x = np.expand_dims(resized / 255.0, axis=0)
+    def _gradcam_step(self, layer_name="block5_conv3"):
+        """
+        Compiled Grad-CAM step for the loaded model, built once per
+        (model, layer_name) and cached on the class.
 
-        preds = model.predict(x)
-        pred_idx = np.argmax(preds[0])
+        step(x_uint8 [N, H, W, 3], class_idx int32 [N]) returns
+        (probabilities, conv activations, d(class score)/d(activations))
+        from a single forward/backward pass. class_idx < 0 means "explain
+        the top predicted class".
+        """
+        import tensorflow as tf
 
-        grad_model = tf.keras.models.Model(
-            [model.inputs],
-            [model.get_layer(layer_name).output, model.output]
-        )
+        with PredictionPipeline._gradcam_lock:
+            model = self._gradcam_model()
+            key = (id(model), layer_name)
+            cache = PredictionPipeline._gradcam_steps
+            if key in cache:
+                return cache[key]
 
-        with tf.GradientTape() as tape:
-            conv_outputs, predictions = grad_model(x)
-            loss = predictions[:, pred_idx]
+            grad_model = tf.keras.models.Model(
+                [model.inputs],
+                [model.get_layer(layer_name).output, model.output]
+            )
+            num_classes = model.output_shape[-1]
+            rescales_input = model_rescales_input(model)
 
-        grads = tape.gradient(loss, conv_outputs)[0]
-        weights = tf.reduce_mean(grads, axis=(0, 1))
+            @tf.function(input_signature=[
+                tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.uint8),
+                tf.TensorSpec((None,), tf.int32),
+            ])
+            def step(x, class_idx):
+                x = tf.cast(x, tf.float32)
+                if not rescales_input:
+                    x = x / 255.0
+                with tf.GradientTape() as tape:
+                    conv_outputs, predictions = grad_model(x, training=False)
+                    top_idx = tf.argmax(predictions, axis=-1, output_type=tf.int32)
+                    target = tf.where(class_idx < 0, top_idx, class_idx)
+                    # per-sample target score; samples don't interact so one
+                    # gradient call gives every sample its own gradients
+                    loss = tf.reduce_sum(
+                        predictions * tf.one_hot(target, num_classes), axis=-1
+                    )
+                grads = tape.gradient(loss, conv_outputs)
+                return predictions, conv_outputs, grads
 
-        cam = np.zeros(conv_outputs[0].shape[0:2], dtype=np.float32)
+            cache[key] = step
+            return step
 
-        for i, w in enumerate(weights):
-            cam += w * conv_outputs[0][:, :, i]
+    def compute_cams(self, x, class_idx, layer_name="block5_conv3"):
+        """
+        (probabilities [N, classes], Grad-CAM maps [N, h, w]) for a uint8
+        batch from one forward/backward pass. Backends with their own
+        Grad-CAM (the model server) compute it where the model lives.
+        """
+        if self.backend.remote:
+            return self.backend.gradcam(x, class_idx, layer_name)
 
-        cam = np.maximum(cam, 0)
-        cam /= (cam.max() + 1e-8)
+        step = self._gradcam_step(layer_name)
+        preds, conv_outputs, grads = step(x, class_idx)
+        # one host transfer each, then a single contraction over channels
+        return preds.numpy(), compute_cam(conv_outputs.numpy(), grads.numpy())
 
-        heatmap = cv2.resize(cam, (ow, oh))
+    def warmup_gradcam(self, layer_name="block5_conv3"):
+        """Trace the Grad-CAM step once on a dummy image before serving."""
+        if self.backend.remote:
+            return
+        model = self._gradcam_model()
+        step = self._gradcam_step(layer_name)
+        # called directly, so warm-up stays out of gradcam_latency
+        step(
+            np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.uint8),
+            np.array([-1], dtype=np.int32)
+        )
 
-        # Mask background
-        gray = cv2.cvtColor(orig, cv2.COLOR_RGB2GRAY)
-        _, mask = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY)
-        heatmap *= (mask.astype("float32") / 255.0)
-        heatmap /= (heatmap.max() + 1e-8)
+    def gradcam_overlay(self, decoded: DecodedImage, pred_idx=None,
+                        layer_name="block5_conv3", alpha=0.45):
+        """Grad-CAM blended over decoded.original, returned as RGB uint8."""
+        orig = decoded.original
 
-        heatmap_color = cv2.applyColorMap(
-            np.uint8(255 * heatmap), cv2.COLORMAP_JET
+        start = time.perf_counter()
+        _, cams = self.compute_cams(
+            np.expand_dims(decoded.model_input, axis=0),
+            np.array([-1 if pred_idx is None else pred_idx], dtype=np.int32),
+            layer_name
         )
-        heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
+        cam = cams[0]
+        PredictionPipeline.gradcam_latency.record(1, time.perf_counter() - start)
+
+        with self._renderer() as renderer:
+            return renderer.render(orig, cam, alpha)
+
+    @contextmanager
+    def _renderer(self):
+        """
+        Borrow an idle HeatmapRenderer (its buffers are reused across
+        requests), or make a new one when all are in use. At most
+        _renderers.maxsize are kept once returned.
+        """
+        try:
+            renderer = PredictionPipeline._renderers.get_nowait()
+        except queue.Empty:
+            renderer = HeatmapRenderer()
+        try:
+            yield renderer
+        finally:
+            try:
+                PredictionPipeline._renderers.put_nowait(renderer)
+            except queue.Full:
+                pass
 
-        alpha = 0.45 if self.last_prediction == "Tumor" else 0.25
-        blended = cv2.addWeighted(orig, 1 - alpha, heatmap_color, alpha, 0)
+    @staticmethod
+    def _save_artifact(out_dir, key, rgb=None, raw_bytes=None):
+        """
+        Write <out_dir>/<key>.jpg unless it already exists. Keys are content
+        hashes, so an existing file already holds the same image; writes go
+        through a temporary file so concurrent workers never see a partial
+        one.
+        """
+        out_path = os.path.join(out_dir, f"{key}.jpg")
+        if os.path.exists(out_path):
+            return out_path
 
-        # Save result safely
-        os.makedirs("static", exist_ok=True)
-        out_path = os.path.join("static", "gradcam_result.jpg")
-        cv2.imwrite(out_path, cv2.cvtColor(blended, cv2.COLOR_RGB2BGR))
+        os.makedirs(out_dir, exist_ok=True)
+        tmp_path = os.path.join(out_dir, f".{key}.{os.getpid()}.{threading.get_ident()}.jpg")
+        with timed("file_write"):
+            if raw_bytes is not None:
+                with open(tmp_path, "wb") as f:
+                    f.write(raw_bytes)
+            else:
+                save_rgb_image(tmp_path, rgb)
+            os.replace(tmp_path, out_path)
 
         return out_path
 
 
+    # ------------------------------------------------------------
+    # 🗂 BATCH Grad-CAM (offline)
+    # ------------------------------------------------------------
+    def explain_batch(self, images, output_dir, class_indices=None,
+                      batch_size=32, layer_name="block5_conv3"):
+        """
+        Offline counterpart of gradcam_overlay for many scans.
+
+        images: iterable of file paths, encoded bytes or RGB ndarrays
+        class_indices: optional per-image class to explain (None / -1 = the
+            predicted class)
+        Each chunk of `batch_size` images gets its predictions and Grad-CAM
+        maps from one GradientTape pass; overlays are written to output_dir
+        as soon as their chunk finishes and one result dict is yielded per
+        image, so memory stays bounded however many images are passed.
+
+        Returns a generator. When images and class_indices both have a
+        len() a length mismatch raises ValueError right here; for plain
+        iterators it is only known while iterating, and the ValueError is
+        raised then, once the shorter one runs out (results already yielded
+        stay valid).
+        """
+        if class_indices is not None and hasattr(images, "__len__") \
+                and hasattr(class_indices, "__len__") and len(images) != len(class_indices):
+            raise ValueError(f"{len(images)} images but {len(class_indices)} class indices")
+        os.makedirs(output_dir, exist_ok=True)
+        return self._explain_batch(images, output_dir, class_indices, batch_size, layer_name)
+
+    def _explain_batch(self, images, output_dir, class_indices, batch_size, layer_name):
+        # held for the whole (lazily consumed) batch, so not borrowed from the pool
+        renderer = HeatmapRenderer()
+        missing = object()
+        if class_indices is None:
+            pairs = zip(images, itertools.repeat(-1))
+        else:
+            # zip() would silently drop the tail of the longer one
+            pairs = itertools.zip_longest(images, class_indices, fillvalue=missing)
+
+        chunk = []
+        for n, (item, target) in enumerate(pairs):
+            if item is missing or target is missing:
+                raise ValueError(f"images and class_indices differ in length (at item {n})")
+            chunk.append((n, item, -1 if target is None else int(target)))
+            if len(chunk) == batch_size:
+                yield from self._explain_chunk(chunk, layer_name, renderer, output_dir)
+                chunk = []
+        if chunk:
+            yield from self._explain_chunk(chunk, layer_name, renderer, output_dir)
+
+    def _explain_chunk(self, chunk, layer_name, renderer, output_dir):
+        decoded, names = [], []
+        for n, item, _ in chunk:
+            if isinstance(item, (str, os.PathLike)):
+                with open(item, "rb") as f:
+                    decoded.append(decode_image(f.read()))
+                names.append(f"{n:06d}_{Path(item).stem}")
+            else:
+                decoded.append(decode_image(item))
+                names.append(f"image_{n:06d}")
+
+        x = np.stack([d.model_input for d in decoded])
+        targets = np.array([t for _, _, t in chunk], dtype=np.int32)
+
+        start = time.perf_counter()
+        preds, cams = self.compute_cams(x, targets, layer_name)
+        PredictionPipeline.gradcam_latency.record(len(x), time.perf_counter() - start)
+
+        for (n, item, target), d, name, p, cam in zip(chunk, decoded, names, preds, cams):
+            cls = int(np.argmax(p))
+            prediction = "Tumor" if cls == 1 else "Normal"
+            alpha = 0.45 if prediction == "Tumor" else 0.25
+
+            out_path = os.path.join(output_dir, f"{name}_gradcam.jpg")
+            save_rgb_image(out_path, renderer.render(d.original, cam, alpha))
+
+            yield {
+                "source": str(item) if isinstance(item, (str, os.PathLike)) else n,
+                "prediction": prediction,
+                "confidence": f"{float(np.max(p)) * 100:.2f}%",
+                "explained_class": cls if target < 0 else target,
+                "gradcam_path": out_path
+            }
+
+
     # ------------------------------------------------------------
     # 📌 MAIN PREDICTION
     # ------------------------------------------------------------
-    def predict(self):
-        model = self.model
+    def predict(self, image_data=None):
+        """
+        image_data: encoded image bytes or an RGB ndarray. The image is decoded
+        once and the same buffers feed the model, Grad-CAM and the report.
+        Falls back to reading self.filename when nothing is passed.
 
-        # Preprocess
-        img = image.load_img(self.filename, target_size=(224, 224))
-        img = image.img_to_array(img) / 255.0
-        img = np.expand_dims(img, axis=0)
+        The original and the Grad-CAM overlay are stored under content-hash
+        names (UPLOADS_DIR / GRADCAM_DIR), so concurrent requests, threads
+        or processes never overwrite each other's files.
+        """
+        if image_data is None:
+            with open(self.filename, "rb") as f:
+                image_data = f.read()
+        return self.predict_many([image_data])
 
-        preds = model.predict(img)
-        confidence = float(np.max(preds)) * 100
-        cls = np.argmax(preds)
+    def predict_many(self, images):
+        """
+        predict() for several images of one request: uncached images share
+        one forward pass and the tumours among them one Grad-CAM pass.
+        A single image goes through the MicroBatcher instead, so it is
+        fused with other concurrent requests. Returns one result per image.
+        """
+        decoded = []
+        for data in images:
+            with timed("image_decode"):
+                decoded.append(decode_image(data))
+        keys = [PredictionCache.key(d.original, self.backend.model_version) for d in decoded]
+        cached = [
+            self.cache.get(k) if self.cache is not None else None for k in keys
+        ]
 
-        prediction = "Tumor" if cls == 1 else "Normal"
-        self.last_prediction = prediction
+        # forward pass for everything the cache didn't answer
+        classes, confidences = [None] * len(decoded), [None] * len(decoded)
+        todo = [i for i, c in enumerate(cached) if c is None]
+        preds = []
+        if len(todo) == 1:
+            preds = [self._forward(decoded[todo[0]].model_input)]
+        elif todo:
+            preds = self.predict_batch(np.stack([decoded[i].model_input for i in todo]))
+        for i, p in zip(todo, preds):
+            classes[i] = int(np.argmax(p))
+            confidences[i] = float(np.max(p)) * 100
+        for i, c in enumerate(cached):
+            if c is not None:
+                classes[i], confidences[i] = c["class_index"], c["confidence"]
+
+        # Generate heatmaps for the new tumours (a cache hit reuses the saved overlay)
+        gradcams = [None] * len(decoded)
+        tumours = [i for i in todo if classes[i] == 1]
+        if tumours:
+            start = time.perf_counter()
+            _, cams = self.compute_cams(
+                np.stack([decoded[i].model_input for i in tumours]),
+                np.array([classes[i] for i in tumours], dtype=np.int32)
+            )
+            PredictionPipeline.gradcam_latency.record(len(tumours), time.perf_counter() - start)
+            with self._renderer() as renderer:
+                for i, cam in zip(tumours, cams):
+                    with timed("heatmap_render"):
+                        gradcams[i] = renderer.render(decoded[i].original, cam, 0.45)
+
+        results = []
+        for i, d in enumerate(decoded):
+            gradcam_path = None
+            if cached[i] is not None:
+                gradcam_path = cached[i]["gradcam_path"]
+            elif gradcams[i] is not None:
+                gradcam_path = self._save_artifact(GRADCAM_DIR, keys[i], rgb=gradcams[i])
 
-        # Save original
-        os.makedirs("static", exist_ok=True)
-        orig_path = "static/original.jpg"
-        shutil.copy(self.filename, orig_path)
+            if self.cache is not None and cached[i] is None:
+                self.cache.put(keys[i], {
+                    "class_index": classes[i],
+                    "confidence": confidences[i],
+                    "gradcam_path": gradcam_path,
+                })
 
-        # Generate heatmap if tumor
-        gradcam_path = None
-        if prediction == "Tumor":
-            gradcam_path = self.generate_gradcam()
+            results.append(self._result(
+                d, keys[i], classes[i], confidences[i], gradcam_path, gradcams[i],
+                cached=cached[i] is not None
+            ))
+
+        for r in results:
+            PREDICTIONS.inc(prediction=r["prediction"], cached=str(r["cached"]).lower())
+        self.last_prediction = results[-1]["prediction"]
+        return results
+
+    def _result(self, decoded, content_key, cls, confidence, gradcam_path, gradcam, cached):
+        prediction = "Tumor" if cls == 1 else "Normal"
+
+        # Save original (straight from the upload buffer, no re-read)
+        orig_path = self._save_artifact(
+            UPLOADS_DIR, content_key, rgb=decoded.original, raw_bytes=decoded.raw_bytes
+        )
 
         # EXTRA data for your report
         report_data = {
@@ -128,10 +465,13 @@ class PredictionPipeline:
             )
         }
 
-        return [{
+        return {
             "prediction": prediction,
             "confidence": f"{confidence:.2f}%",
             "gradcam_path": gradcam_path,
             "original_image_path": orig_path,
-            "report": report_data
-        }]
+            "report": report_data,
+            "cached": cached,
+            # in-memory RGB buffers for the report (not JSON serialisable)
+            "images": {"original": decoded.original, "gradcam": gradcam}
+        }
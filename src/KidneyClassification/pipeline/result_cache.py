@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from KidneyClassification import logger
+
+
+# keys become file names in disk_dir: no separators, dots or absolute paths
+_KEY_RE = re.compile(r"[0-9A-Za-z_-]{1,128}")
+
+
+def _stat_all(paths):
+    """(path, stat) pairs, skipping files another process removed meanwhile"""
+    for path in paths:
+        try:
+            yield path, path.stat()
+        except FileNotFoundError:
+            continue
+
+
+class JSONStore:
+    """
+    Bounded key -> JSON-serialisable dict store.
+
+    The in-memory tier holds at most `max_entries` and evicts the least
+    recently used one. With `disk_dir` set, every entry is also written
+    there as one JSON file, so entries survive restarts and are visible to
+    other processes (or hosts) sharing the directory; that tier is pruned
+    oldest-first once it grows past `max_disk_entries`.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir=None, max_disk_entries: int = 10000):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+
+        self.max_entries = int(max_entries)
+        self.max_disk_entries = int(max_disk_entries)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._disk_count = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_count = sum(1 for _ in self.disk_dir.glob("*.json"))
+
+    @staticmethod
+    def valid_key(key) -> bool:
+        return isinstance(key, str) and _KEY_RE.fullmatch(key) is not None
+
+    def get(self, key: str):
+        if not self.valid_key(key):
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._valid(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry)
+
+        entry = self._read_disk(key)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return dict(entry)
+
+    def put(self, key: str, entry: dict):
+        if not self.valid_key(key):
+            raise ValueError(f"invalid store key {key!r}")
+        entry = dict(entry)
+        with self._lock:
+            self._insert(key, entry)
+        if self.disk_dir is not None:
+            self._write_disk(key, entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_entries": self._disk_count if self.disk_dir is not None else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def _valid(self, entry: dict) -> bool:
+        """hook: False makes a stored entry count as a miss"""
+        return True
+
+    # ---- internals (memory tier under self._lock) ----
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if self._valid(entry) else None
+
+    def _write_disk(self, key, entry):
+        path = self.disk_dir / f"{key}.json"
+        # the directory is shared by worker processes, whose thread idents repeat
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            existed = path.exists()
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"could not write store entry {path}: {e}")
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if not existed:
+                self._disk_count += 1
+            prune = self._disk_count > self.max_disk_entries
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """drop the oldest 10% of disk entries"""
+        files = [path for _, path in sorted(
+            (st.st_mtime, path) for path, st in _stat_all(self.disk_dir.glob("*.json"))
+        )]
+        excess = len(files) - self.max_disk_entries
+        drop = files[:max(excess, 0) + self.max_disk_entries // 10]
+        with self._lock:
+            live = set(self._entries)
+        removed = 0
+        for path in drop:
+            if path.stem in live:
+                continue
+            path.unlink(missing_ok=True)
+            removed += 1
+        with self._lock:
+            self._disk_count = len(files) - removed
+        logger.info(f"pruned {removed} entries from {self.disk_dir}")
+
+
+class PredictionCache(JSONStore):
+    """
+    Prediction results keyed by a hash of the decoded pixels and the model
+    version, so a resubmitted scan skips the forward and Grad-CAM passes.
+
+    Entries are small dicts (class index, confidence, gradcam_path). An
+    entry whose Grad-CAM overlay has since been pruned from disk counts as
+    a miss.
+    """
+
+    @staticmethod
+    def key(pixels: np.ndarray, model_version: str) -> str:
+        """hash of the decoded image (shape + pixels) and the model version"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(model_version.encode())
+        h.update(str(pixels.shape).encode())
+        h.update(np.ascontiguousarray(pixels).data)
+        return h.hexdigest()
+
+    def _valid(self, entry: dict) -> bool:
+        gradcam_path = entry.get("gradcam_path")
+        return not gradcam_path or os.path.exists(gradcam_path)
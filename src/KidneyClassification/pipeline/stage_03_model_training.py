@@ -13,6 +13,7 @@ class ModelTrainingPipeline:
         config = ConfigurationManager()
         training_config = config.get_training_config()
         training = Training(config=training_config)
+        training.configure_runtime()
         training.get_base_model()
         training.train_valid_generator()
         training.train()
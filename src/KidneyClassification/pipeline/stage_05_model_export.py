@@ -0,0 +1,34 @@
+from KidneyClassification.config.configuration import ConfigurationManager
+from KidneyClassification.components.model_export import ModelExport
+from KidneyClassification import logger
+
+
+STAGE_NAME = "Model Export stage"
+
+
+class ModelExportPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        config = ConfigurationManager()
+        model_export_config = config.get_model_export_config()
+
+        model_export = ModelExport(model_export_config)
+        tflite_path = model_export.export_tflite()
+        model_export.export_saved_model()
+        onnx_path = model_export.export_onnx()
+        scores = model_export.evaluate(tflite_path, onnx_path)
+        logger.info(f"export scores: {scores}")
+
+
+if __name__ == "__main__":
+    try:
+        logger.info(f"***************")
+        logger.info(f">>>>> stage {STAGE_NAME} started <<<<<")
+        obj = ModelExportPipeline()
+        obj.main()
+        logger.info(f">>>>> stage {STAGE_NAME} completed <<<<<\n\nx=========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
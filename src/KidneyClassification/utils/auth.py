@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from KidneyClassification import logger
+
+
+class AuthBusy(Exception):
+    """too many password hashes already queued; the caller should retry later"""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing (scrypt/pbkdf2, deliberately slow) on a small
+    dedicated thread pool instead of the request thread.
+
+    At most `workers` hashes run at once, so logins can never take more
+    than that many cores from the prediction workers (hashlib releases the
+    GIL while hashing). At most `max_pending` more may wait; beyond that
+    hash()/verify() raise AuthBusy straight away rather than queueing
+    without bound. They also raise AuthBusy when the result takes longer
+    than `timeout` seconds (the hash keeps its worker until it finishes).
+    Stored hashes with different cost parameters than `method` report
+    needs_rehash(), so they can be upgraded on login.
+    """
+
+    def __init__(self, method: str = "scrypt:32768:8:1", workers: int = 1,
+                 max_pending: int = 8, timeout: float = 30.0):
+        self.method = method
+        self.timeout = timeout
+        # normalised prefix of hashes made with `method`, e.g. "scrypt" -> "scrypt:32768:8:1"
+        self._prefix = generate_password_hash("", method=method).split("$", 1)[0]
+        self._slots = threading.BoundedSemaphore(int(workers) + int(max_pending))
+        self._executor = ThreadPoolExecutor(max_workers=int(workers), thread_name_prefix="PasswordHasher")
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise AuthBusy("password hashing queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _wait(self, future):
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise AuthBusy(f"password hashing took longer than {self.timeout} s") from None
+
+    def hash(self, password: str) -> str:
+        return self._wait(self._run(generate_password_hash, password, self.method))
+
+    def verify(self, stored_hash: str, password: str) -> bool:
+        return self._wait(self._run(check_password_hash, stored_hash, password))
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        return stored_hash.split("$", 1)[0] != self._prefix
+
+    def rehash_later(self, password: str, store):
+        """hash `password` with the configured method in the background and call store(new_hash)"""
+        try:
+            future = self._run(generate_password_hash, password, self.method)
+        except AuthBusy:
+            return  # try again on a later login
+        def done(f):
+            if f.exception() is None:
+                store(f.result())
+            else:
+                logger.warning(f"password rehash failed: {f.exception()}")
+        future.add_done_callback(done)
+
+
+class RateLimiter:
+    """
+    Sliding-window counter: allow() is False once `key` has been hit
+    `max_hits` times within the last `window_s` seconds.
+    """
+
+    def __init__(self, max_hits: int, window_s: float, max_keys: int = 100000):
+        self.max_hits = int(max_hits)
+        self.window_s = float(window_s)
+        self.max_keys = int(max_keys)
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window_s:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def allow(self, key) -> bool:
+        with self._lock:
+            hits = self._recent(key, time.monotonic())
+            return hits is None or len(hits) < self.max_hits
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._hits) >= self.max_keys:
+                # drop keys with no hits left in the window
+                for k in list(self._hits):
+                    self._recent(k, now)
+            hits = self._recent(key, now)
+            if hits is None:
+                hits = self._hits[key] = deque()
+            hits.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def retry_after(self, key) -> int:
+        """seconds until `key` is allowed again"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._recent(key, now)
+            if hits is None or len(hits) < self.max_hits:
+                return 0
+            return max(1, int(hits[-self.max_hits] + self.window_s - now + 1))
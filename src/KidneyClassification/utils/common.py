@@ -9,6 +9,7 @@ from box import ConfigBox
 from pathlib import Path
 from typing import Any
 import base64
+import time
 
 
 
@@ -125,6 +126,60 @@ def get_size(path: Path) -> str:
     return f"~ {size_in_kb} KB"
 
 
+def prune_directory(directory: Path, pattern: str = "*", max_age_s: float = None,
+                    max_total_bytes: int = None, keep=()) -> list:
+    """delete old files to keep a directory bounded
+
+    Files older than max_age_s go first, then the oldest remaining ones
+    until the directory holds at most max_total_bytes. Files already removed
+    by another process are skipped.
+
+    Args:
+        directory (Path): directory to prune
+        pattern (str): glob of the files to consider
+        max_age_s (float, optional): maximum file age in seconds
+        max_total_bytes (int, optional): maximum total size
+        keep (iterable, optional): paths that must not be deleted
+
+    Returns:
+        list: paths of the deleted files
+    """
+    keep = {str(p) for p in keep}
+    files = []
+    for path in Path(directory).glob(pattern):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+    files.sort()
+
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    removed = []
+    for mtime, size, path in files:
+        if str(path) in keep:
+            continue
+        too_old = max_age_s is not None and now - mtime > max_age_s
+        too_big = max_total_bytes is not None and total > max_total_bytes
+        if too_old or too_big:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(str(path))
+    return removed
+
+
+def model_rescales_input(model) -> bool:
+    """True if the model normalises pixels itself (a Rescaling layer right after
+    the input), i.e. it must be fed raw [0, 255] values rather than [0, 1].
+    Models trained before the in-graph Rescaling layer return False.
+    """
+    return any(type(layer).__name__ == "Rescaling" for layer in model.layers[:3])
+
+
 def decodeImage(imgstring, fileName):
     imgdata = base64.b64decode(imgstring)
     with open(fileName, 'wb') as f:
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+
+
+def compute_cam(conv_outputs: np.ndarray, grads: np.ndarray) -> np.ndarray:
+    """Grad-CAM maps for a batch, computed in one contraction
+
+    Args:
+        conv_outputs (np.ndarray): conv activations, shape (N, h, w, C)
+        grads (np.ndarray): d(target score)/d(activations), same shape
+
+    Returns:
+        np.ndarray: ReLU'd class activation maps, shape (N, h, w), float32
+    """
+    weights = grads.mean(axis=(1, 2), dtype=np.float32)             # (N, C)
+    cam = np.einsum("nhwc,nc->nhw", conv_outputs, weights, optimize=True)
+    np.maximum(cam, 0, out=cam)
+    return cam.astype(np.float32, copy=False)
+
+
+def _jet_lut() -> np.ndarray:
+    # cv2's JET colormap as a (256, 3) RGB lookup table
+    ramp = np.arange(256, dtype=np.uint8).reshape(256, 1)
+    return np.ascontiguousarray(cv2.applyColorMap(ramp, cv2.COLORMAP_JET)[:, 0, ::-1])
+
+
+class HeatmapRenderer:
+    """
+    Masks, normalises, colours and alpha-blends a CAM over the original scan.
+
+    Every intermediate (resized heatmap, grayscale, mask, uint8 heatmap,
+    colour image) lives in a buffer that is reused while the image size stays
+    the same, so a steady stream of same-sized scans allocates only the
+    returned overlay. Not thread-safe: one thread at a time per renderer
+    (PredictionPipeline lends them out from a small shared pool).
+    """
+
+    _lut = None
+
+    def __init__(self, mask_threshold: int = 10):
+        self.mask_threshold = mask_threshold
+        self._shape = None
+
+        if HeatmapRenderer._lut is None:
+            HeatmapRenderer._lut = _jet_lut()
+
+    def _ensure_buffers(self, h: int, w: int):
+        if self._shape == (h, w):
+            return
+        self._shape = (h, w)
+        self._heat = np.empty((h, w), dtype=np.float32)
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._mask = np.empty((h, w), dtype=np.uint8)
+        self._heat_u8 = np.empty((h, w), dtype=np.uint8)
+        self._color = np.empty((h, w, 3), dtype=np.uint8)
+
+    def render(self, orig: np.ndarray, cam: np.ndarray, alpha: float = 0.45,
+               out: np.ndarray = None) -> np.ndarray:
+        """
+        orig: RGB uint8 (H, W, 3); cam: float32 (h, w), already ReLU'd.
+        Returns the blended RGB uint8 overlay (written into `out` if given).
+        """
+        h, w = orig.shape[:2]
+        self._ensure_buffers(h, w)
+        heat, gray, mask = self._heat, self._gray, self._mask
+
+        # normalise on the small map first, as the original CAM code did
+        cv2.resize(cam / (cam.max() + 1e-8), (w, h), dst=heat)
+
+        # Mask background (mask is 0/1 so the multiply is a select)
+        cv2.cvtColor(orig, cv2.COLOR_RGB2GRAY, dst=gray)
+        cv2.threshold(gray, self.mask_threshold, 1, cv2.THRESH_BINARY, dst=mask)
+        np.multiply(heat, mask, out=heat)
+
+        heat *= 255.0 / (heat.max() + 1e-8)
+        np.copyto(self._heat_u8, heat, casting="unsafe")
+
+        np.take(HeatmapRenderer._lut, self._heat_u8, axis=0, out=self._color)
+
+        if out is None:
+            out = np.empty_like(orig)
+        cv2.addWeighted(orig, 1 - alpha, self._color, alpha, 0, dst=out)
+        return out
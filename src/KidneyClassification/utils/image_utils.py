@@ -0,0 +1,73 @@
+import base64
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class DecodedImage:
+    """
+    One request's image, decoded exactly once.
+
+    original:    full resolution RGB uint8 (H, W, 3), used for Grad-CAM overlay
+                 and the report
+    model_input: RGB uint8 resized to the model's input size
+    raw_bytes:   the encoded upload, if we were given one (lets us save the
+                 original without re-encoding)
+    """
+    original: np.ndarray
+    model_input: np.ndarray
+    raw_bytes: Optional[bytes] = None
+
+
+def decode_base64(imgstring: str) -> bytes:
+    """base64 upload string -> encoded image bytes (no disk round trip)"""
+    return base64.b64decode(imgstring)
+
+
+def decode_image(data: Union[bytes, bytearray, memoryview, np.ndarray],
+                 target_size: Tuple[int, int] = (224, 224)) -> DecodedImage:
+    """decode an upload into a DecodedImage
+
+    Args:
+        data: encoded image bytes (jpg/png/...) or an RGB / grayscale ndarray
+        target_size: (height, width) expected by the model
+
+    Raises:
+        ValueError: if the bytes are not a decodable image
+
+    Returns:
+        DecodedImage: original + resized uint8 buffers
+    """
+    raw_bytes = None
+
+    if isinstance(data, np.ndarray):
+        rgb = data
+        if rgb.ndim == 2:
+            rgb = cv2.cvtColor(rgb, cv2.COLOR_GRAY2RGB)
+        elif rgb.shape[-1] == 4:
+            rgb = cv2.cvtColor(rgb, cv2.COLOR_RGBA2RGB)
+        if rgb.dtype != np.uint8:
+            rgb = np.clip(rgb, 0, 255).astype(np.uint8)
+    else:
+        raw_bytes = bytes(data)
+        buf = np.frombuffer(raw_bytes, dtype=np.uint8)
+        bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise ValueError("could not decode image data")
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+    rgb = np.ascontiguousarray(rgb)
+
+    h, w = target_size
+    # nearest matches keras' image.load_img default the model was served with
+    model_input = cv2.resize(rgb, (w, h), interpolation=cv2.INTER_NEAREST)
+
+    return DecodedImage(original=rgb, model_input=model_input, raw_bytes=raw_bytes)
+
+
+def save_rgb_image(path: str, rgb: np.ndarray):
+    """write an RGB uint8 buffer to disk (cv2 expects BGR)"""
+    cv2.imwrite(str(path), cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
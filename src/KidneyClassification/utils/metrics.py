@@ -0,0 +1,172 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from KidneyClassification import logger
+
+
+# seconds; covers a cached lookup (~1 ms) up to a cold Grad-CAM pass
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self.labelnames, key, value
+
+
+class Histogram:
+    """cumulative-bucket latency histogram, one series per label set"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        names = self.labelnames + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield f"{self.name}_bucket", names, key + (_number(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, key, series[-1]
+            yield f"{self.name}_count", self.labelnames, key, cumulative
+
+
+class Callback:
+    """
+    Value read at scrape time from `fn`, which returns a number (or None
+    to skip) or, with labelnames, an iterable of (label values, number).
+    """
+
+    def __init__(self, name, documentation, fn, labelnames=(), kind="gauge"):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.fn, self.kind = fn, kind
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        if not self.labelnames:
+            value = [((), value)]
+        for key, v in value:
+            if v is not None:
+                yield self.name, self.labelnames, tuple(str(k) for k in key), v
+
+
+class Registry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format
+    (version 0.0.4). Metrics are per process: with several web workers
+    each one reports its own.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # re-registering a name (e.g. a reloaded module) replaces it
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, fn, labelnames=(), kind="gauge") -> Callback:
+        return self._add(Callback(name, documentation, fn, labelnames, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                # one broken callback must not take the whole endpoint down
+                logger.warning(f"metric {metric.name} failed: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, key, value in samples:
+                lines.append(f"{name}{_labels(labelnames, key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# per-stage latency of the prediction path
+STAGE_SECONDS = REGISTRY.histogram(
+    "kidney_stage_seconds",
+    "Latency of one stage of a prediction request",
+    ["stage"]
+)
+PREDICTIONS = REGISTRY.counter(
+    "kidney_predictions_total",
+    "Predictions served, by predicted class and whether the result cache answered",
+    ["prediction", "cached"]
+)
+
+
+def timed(stage: str):
+    """with timed("image_decode"): ... records into kidney_stage_seconds"""
+    return STAGE_SECONDS.time(stage=stage)
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from KidneyClassification import logger
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username     TEXT PRIMARY KEY,
+    password     TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    created      REAL NOT NULL
+);
+"""
+
+
+class UserStore:
+    """
+    User accounts in SQLite, keyed (and indexed) by username.
+
+    Lookups and inserts touch one row, so login/register cost stays the
+    same however many users there are. WAL mode plus the primary key make
+    concurrent registrations from several worker processes safe: the
+    second insert of a username fails instead of overwriting the first.
+
+    On first use the accounts from `legacy_json` (the old users.json) are
+    imported once; the file is left in place but no longer read.
+    """
+
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = Path(db_path)
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        if legacy_json is not None:
+            self._migrate(Path(legacy_json))
+
+    @contextmanager
+    def _db(self):
+        # one short-lived connection per call, like JobQueue: request threads
+        # come and go, so per-thread connections would only leak
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # ---- API ----
+    def get(self, username: str):
+        """{"password", "display_name"} of the user, or None"""
+        with self._db() as db:
+            row = db.execute(
+                "SELECT password, display_name FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"password": row[0], "display_name": row[1]}
+
+    def add(self, username: str, password_hash: str, display_name: str) -> bool:
+        """insert a new user; False if the username is taken"""
+        try:
+            with self._db() as db:
+                db.execute(
+                    "INSERT INTO users (username, password, display_name, created) VALUES (?, ?, ?, ?)",
+                    (username, password_hash, display_name, time.time())
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def seed(self, username: str, password_hash: str, display_name: str) -> bool:
+        """insert the first user, only while the store is still empty"""
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+                    db.execute("COMMIT")
+                    return False
+                db.execute(
+                    "INSERT INTO users (username, password, display_name, created) VALUES (?, ?, ?, ?)",
+                    (username, password_hash, display_name, time.time())
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        logger.info(f"created default user {username}")
+        return True
+
+    def set_password(self, username: str, password_hash: str):
+        with self._db() as db:
+            db.execute(
+                "UPDATE users SET password = ? WHERE username = ?", (password_hash, username)
+            )
+
+    def __len__(self):
+        with self._db() as db:
+            return db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    # ---- migration ----
+    def _migrate(self, legacy_json: Path):
+        if not legacy_json.exists():
+            return
+        with self._db() as db:
+            # IMMEDIATE: only one process imports, the others see a full table
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+                    db.execute("COMMIT")
+                    return
+                with open(legacy_json) as f:
+                    users = json.load(f)
+                now = time.time()
+                db.executemany(
+                    "INSERT OR IGNORE INTO users (username, password, display_name, created) VALUES (?, ?, ?, ?)",
+                    [
+                        (name, user["password"], user.get("display_name", name), now)
+                        for name, user in users.items()
+                    ]
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        logger.info(f"imported {len(users)} users from {legacy_json} into {self.db_path}")
+